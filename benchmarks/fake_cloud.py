@@ -0,0 +1,244 @@
+"""Local stand-in for the EcoFlow cloud, for load testing large fleets.
+
+    python -m benchmarks.fake_cloud --panels 200 --rate 50 --broker localhost:1883
+
+Serves the Open API endpoints used by the integration over HTTP, with the same
+request signature check as the cloud (json bodies included), and publishes synthetic Smart Home Panel
+quota/heartbeat traffic for N panels through a local MQTT broker (for example
+mosquitto). `set` commands are answered with `set_reply`.
+
+Point the integration at it with `EcoFlowApiClient(key, secret, hass,
+base_uri="http://localhost:8080/", allow_plaintext_mqtt=True)`. The certification
+endpoint hands out the local broker with protocol "mqtt", which is only connected
+without TLS because of that flag.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+
+from pathlib import Path
+
+from aiohttp import web
+import paho.mqtt.client as mqtt
+
+_LOGGER = logging.getLogger("fake_cloud")
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+SN_PREFIX = "SP10ZAW5ZE"
+MAX_TIMESTAMP_SKEW_MS = 5 * 60 * 1000
+TICK = 0.01
+
+
+def sign(secret: str, query: str, access_key: str, nonce: str, timestamp: str) -> str:
+    target = f"accessKey={access_key}&nonce={nonce}&timestamp={timestamp}"
+    if query:
+        target = f"{query}&{target}"
+    return hmac.new(secret.encode(), target.encode(), hashlib.sha256).hexdigest()
+
+
+def flatten(data, prefix: str = "") -> dict:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            flat.update(flatten(value, f"{prefix}[{index}]"))
+    else:
+        flat[prefix] = data
+    return flat
+
+
+def signed_query(request: web.Request, body: dict | None) -> str:
+    """Json bodies are signed as their flattened, ascii sorted params."""
+    if body:
+        return "&".join(f"{key}={value}" for key, value in sorted(flatten(body).items()))
+    return request.rel_url.raw_query_string
+
+
+def ok(data=None) -> web.Response:
+    return web.json_response({"code": "0", "message": "Success", "data": data})
+
+
+def error(code: str, message: str) -> web.Response:
+    return web.json_response({"code": code, "message": message})
+
+
+class FakeCloud:
+    def __init__(self, args) -> None:
+        self.args = args
+        self.serials = [f"{SN_PREFIX}{index:06d}" for index in range(args.panels)]
+        self.snapshot = json.loads((CORPUS_DIR / "quota_all.json").read_text())
+        broker_host, _, broker_port = args.broker.partition(":")
+        self.broker_host = broker_host
+        self.broker_port = int(broker_port or 1883)
+        self.account = f"open-{args.access_key}"
+        self.mqtt: mqtt.Client | None = None
+        self.published = 0
+        self.replies = 0
+        self.requests = 0
+        self.rejected = 0
+
+    # http
+
+    @web.middleware
+    async def check_signature(self, request: web.Request, handler):
+        self.requests += 1
+        headers = request.headers
+        access_key = headers.get("accessKey", "")
+        nonce = headers.get("nonce", "")
+        timestamp = headers.get("timestamp", "")
+        body = await request.json() if request.body_exists else None
+        expected = sign(self.args.secret, signed_query(request, body), access_key, nonce, timestamp)
+        if access_key != self.args.access_key or not hmac.compare_digest(expected, headers.get("sign", "")):
+            self.rejected += 1
+            return error("8521", "signature is wrong")
+        if not timestamp.isdigit() or abs(int(timestamp) - time.time() * 1000) > MAX_TIMESTAMP_SKEW_MS:
+            self.rejected += 1
+            return error("8513", "timestamp is expired")
+        return await handler(request)
+
+    async def device_list(self, request: web.Request) -> web.Response:
+        return ok([{"sn": sn, "productName": "Smart Home Panel", "online": 1} for sn in self.serials])
+
+    async def certification(self, request: web.Request) -> web.Response:
+        return ok({
+            "certificateAccount": self.account,
+            "certificatePassword": "fake",
+            "url": self.broker_host,
+            "port": str(self.broker_port),
+            "protocol": "mqtt",
+        })
+
+    async def quota_all(self, request: web.Request) -> web.Response:
+        if request.query.get("sn") not in self.serials:
+            return error("1006", "device not found")
+        return ok(self.snapshot)
+
+    async def quota(self, request: web.Request) -> web.Response:
+        if request.method == "PUT":
+            return ok()
+        body = await request.json() if request.body_exists else {}
+        sn = body.get("sn") or request.query.get("sn")
+        if sn not in self.serials:
+            return error("1006", "device not found")
+        quotas = body.get("params", {}).get("quotas", [])
+        return ok({key: self.snapshot[key] for key in quotas if key in self.snapshot})
+
+    def http_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.check_signature])
+        app.router.add_get("/iot-open/sign/device/list", self.device_list)
+        app.router.add_get("/iot-open/sign/certification", self.certification)
+        app.router.add_get("/iot-open/sign/device/quota/all", self.quota_all)
+        app.router.add_route("*", "/iot-open/sign/device/quota", self.quota)
+        return app
+
+    # mqtt
+
+    def on_connect(self, client, userdata, flags, rc):
+        _LOGGER.info(f"Connected to broker {rc}")
+        client.subscribe(f"/open/{self.account}/+/set")
+
+    def on_message(self, client, userdata, message):
+        sn = message.topic.split("/")[3]
+        try:
+            command = json.loads(message.payload)
+        except ValueError:
+            return
+        params = command.get("params", {})
+        reply = {
+            "id": command.get("id"),
+            "version": command.get("version", "1.0"),
+            "operateType": command.get("operateType", "TCP"),
+            "code": "0",
+            "data": {"sta": 0, "cmdSet": params.get("cmdSet", 11), "ack": 0, "id": params.get("id", 0)},
+        }
+        client.publish(f"/open/{self.account}/{sn}/set_reply", json.dumps(reply))
+        self.replies += 1
+
+    def quota_message(self, index: int) -> bytes:
+        if index % 3 == 0:
+            heartbeat = {
+                "loadCmdChCtrlInfos": self.snapshot["heartbeat.loadCmdChCtrlInfos"],
+                "energyInfos": copy.deepcopy(self.snapshot["heartbeat.energyInfos"]),
+            }
+            for battery in heartbeat["energyInfos"]:
+                battery["batteryPercentage"] = random.randint(20, 100)
+            params = {"heartbeat": heartbeat}
+        else:
+            params = {"infoList": [
+                {"chWatt": round(random.uniform(0, 800), 1), "powType": channel["powType"]}
+                for channel in self.snapshot["channelPower.infoList"]
+            ]}
+        return json.dumps({"id": index, "version": "1.0", "timestamp": int(time.time() * 1000),
+                           "params": params}).encode()
+
+    async def publish_loop(self):
+        per_tick = self.args.panels * self.args.rate * TICK
+        budget = 0.0
+        index = 0
+        panels = len(self.serials)
+        while True:
+            budget += per_tick
+            while budget >= 1:
+                sn = self.serials[index % panels]
+                self.mqtt.publish(f"/open/{self.account}/{sn}/quota", self.quota_message(index // panels))
+                self.published += 1
+                index += 1
+                budget -= 1
+            await asyncio.sleep(TICK)
+
+    async def report_loop(self):
+        last = 0
+        while True:
+            await asyncio.sleep(10)
+            _LOGGER.info(f"published {(self.published - last) / 10:.0f} msg/s, total {self.published}, "
+                         f"replies {self.replies}, http requests {self.requests}, rejected {self.rejected}")
+            last = self.published
+
+    async def run(self):
+        runner = web.AppRunner(self.http_app())
+        await runner.setup()
+        await web.TCPSite(runner, self.args.http_host, self.args.http_port).start()
+        _LOGGER.info(f"HTTP on {self.args.http_host}:{self.args.http_port}, {len(self.serials)} panels")
+
+        self.mqtt = mqtt.Client(client_id=f"fake_cloud_{random.randint(0, 10000)}")
+        self.mqtt.max_queued_messages_set(0)
+        self.mqtt.on_connect = self.on_connect
+        self.mqtt.on_message = self.on_message
+        self.mqtt.connect(self.broker_host, self.broker_port)
+        self.mqtt.loop_start()
+        try:
+            await asyncio.gather(self.publish_loop(), self.report_loop())
+        finally:
+            self.mqtt.loop_stop()
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--panels", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1, help="quota messages per second per panel")
+    parser.add_argument("--broker", default="localhost:1883")
+    parser.add_argument("--http-host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--access-key", default="fake-access-key")
+    parser.add_argument("--secret", default="fake-secret")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(FakeCloud(args).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Minimal stand-ins for the Home Assistant modules the integration imports.
+
+Installed into `sys.modules` before the integration is imported, so the message path
+can be benchmarked without a hass instance, broker or network.
+"""
+from __future__ import annotations
+
+import asyncio
+import enum
+import json
+import sys
+import types
+
+
+class _Base:
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def __class_getitem__(cls, item):
+        return cls
+
+
+class _Names(type):
+    def __getattr__(cls, name):
+        return name
+
+
+class _Constants(metaclass=_Names):
+    pass
+
+
+class DataUpdateCoordinator(_Base):
+    def __init__(self, hass, logger, name=None, update_interval=None, always_update=True, **kwargs) -> None:
+        self.hass = hass
+        self.logger = logger
+        self.name = name
+        self.update_interval = update_interval
+        self.data = None
+        self._listeners = []
+
+    def async_add_listener(self, update_callback):
+        self._listeners.append(update_callback)
+        return lambda: self._listeners.remove(update_callback)
+
+    def async_update_listeners(self):
+        for update_callback in self._listeners:
+            update_callback()
+
+    def async_set_updated_data(self, data):
+        self.data = data
+        self.async_update_listeners()
+
+
+class CoordinatorEntity(_Base):
+    def __init__(self, coordinator) -> None:
+        self.coordinator = coordinator
+        self.state_writes = 0
+        coordinator.async_add_listener(self._handle_coordinator_update)
+
+    def _handle_coordinator_update(self) -> None:
+        self.async_write_ha_state()
+
+    def async_write_ha_state(self):
+        self.state_writes += 1
+
+
+class Store(_Base):
+    """In memory store, what was saved under a key is loaded by the next store of that key."""
+    saved = {}
+
+    def __init__(self, hass, version, key, **kwargs) -> None:
+        self.key = key
+        self._data_func = None
+
+    async def async_load(self):
+        data = Store.saved.get(self.key)
+        return None if data is None else json.loads(data)
+
+    async def async_save(self, data):
+        self._data_func = None
+        Store.saved[self.key] = json.dumps(data)
+
+    def async_delay_save(self, data_func, delay=0):
+        self._data_func = data_func
+
+    async def async_remove(self):
+        Store.saved.pop(self.key, None)
+
+
+class Platform(enum.StrEnum):
+    SENSOR = "sensor"
+    SWITCH = "switch"
+    SELECT = "select"
+
+
+class FakeHass:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.data = {}
+        self._tasks = set()
+
+    def async_create_background_task(self, target, name=None, eager_start=False):
+        task = self.loop.create_task(target)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def async_create_task(self, target, name=None, eager_start=False):
+        return self.async_create_background_task(target, name)
+
+    def add_job(self, target, *args):
+        result = target(*args)
+        if asyncio.iscoroutine(result):
+            self.async_create_task(result)
+
+
+def async_call_later(hass, delay, action):
+    handle = hass.loop.call_later(delay, action, None)
+    return handle.cancel
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def _entity(name: str) -> type:
+    return type(name, (_Base,), {})
+
+
+def install():
+    """Replace homeassistant (and missing client libraries) with stubs."""
+    _module("homeassistant", __path__=[])
+    _module("homeassistant.core", HomeAssistant=FakeHass, Event=_Base, CALLBACK_TYPE=object,
+            callback=lambda func: func)
+    _module("homeassistant.const", Platform=Platform, PERCENTAGE="%", EntityCategory=_Constants,
+            EVENT_HOMEASSISTANT_CLOSE="homeassistant_close",
+            EVENT_HOMEASSISTANT_STOP="homeassistant_stop", UnitOfElectricCurrent=_Constants, UnitOfEnergy=_Constants, UnitOfPower=_Constants,
+            UnitOfTemperature=_Constants, UnitOfTime=_Constants)
+    _module("homeassistant.exceptions", HomeAssistantError=Exception, ConfigEntryNotReady=Exception)
+    _module("homeassistant.config_entries", ConfigEntry=_Base, ConfigFlow=_Base, OptionsFlow=_Base,
+            CONN_CLASS_LOCAL_PUSH="local_push")
+    _module("homeassistant.components", __path__=[])
+    _module("homeassistant.components.sensor", SensorEntity=_entity("SensorEntity"))
+    _module("homeassistant.components.sensor.const", SensorDeviceClass=_Constants, SensorStateClass=_Constants)
+    _module("homeassistant.components.switch", SwitchEntity=_entity("SwitchEntity"))
+    _module("homeassistant.components.select", SelectEntity=_entity("SelectEntity"))
+    _module("homeassistant.components.diagnostics", async_redact_data=lambda data, keys: data)
+    _module("homeassistant.components.mqtt", __path__=[])
+    _module("homeassistant.components.mqtt.async_client", AsyncMQTTClient=_Base)
+    _module("homeassistant.helpers", __path__=[])
+    _module("homeassistant.helpers.device_registry", DeviceEntryType=_Constants)
+    _module("homeassistant.helpers.dispatcher", async_dispatcher_send=lambda hass, signal, *args: None,
+            async_dispatcher_connect=lambda hass, signal, target: lambda: None)
+    _module("homeassistant.helpers.storage", Store=Store)
+    _module("homeassistant.helpers.event", async_call_later=async_call_later)
+    _module("homeassistant.helpers.entity", DeviceInfo=dict, Entity=_entity("Entity"))
+    _module("homeassistant.helpers.update_coordinator", DataUpdateCoordinator=DataUpdateCoordinator,
+            CoordinatorEntity=CoordinatorEntity, UpdateFailed=Exception)
+
+    for name, attrs in (("aiohttp", {"ClientResponse": _Base, "ClientError": OSError}),
+                        ("dacite", {"from_dict": lambda data_class, data: data, "Config": _Base})):
+        try:
+            __import__(name)
+        except ImportError:
+            _module(name, **attrs)
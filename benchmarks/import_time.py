@@ -0,0 +1,105 @@
+"""Import time of the integration package against a budget.
+
+    python -m benchmarks.import_time [--runs N] [--budget MS]
+
+Every run imports `custom_components.ecoflow_energy` in a fresh interpreter with the
+Home Assistant stand-ins installed and the modules Home Assistant loads before any
+integration already imported, so the time is what the integration adds. The median
+of the runs is compared with the budget. The import must also stay lean: entity
+platforms, device models and dacite are loaded when their platform is set up or
+first used, never by the package import.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "custom_components.ecoflow_energy"
+
+IMPORT_BUDGET_MS = 35
+
+# loaded by Home Assistant itself long before the integration
+PRELOADED = ("asyncio", "concurrent.futures", "dataclasses", "datetime", "enum", "hashlib", "hmac", "inspect",
+             "json", "logging", "random", "secrets", "ssl", "threading", "typing", "orjson")
+
+# must not be loaded by importing the package
+DEFERRED_MODULES = (
+    f"{PACKAGE}.sensor",
+    f"{PACKAGE}.switch",
+    f"{PACKAGE}.select",
+    f"{PACKAGE}.entity",
+    f"{PACKAGE}.device.models",
+    f"{PACKAGE}.device.smart_home_panel",
+    f"{PACKAGE}.device.declarative",
+)
+DEFERRED_IMPORTS = ("dacite",)
+
+# runs in the fresh interpreter, prints what the package import did as json
+_PROBE = f"""
+import builtins, json, sys, time
+sys.path.insert(0, {str(ROOT)!r})
+from benchmarks import hass_stub
+hass_stub.install()
+for name in {PRELOADED!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+
+requested = set()
+real_import = builtins.__import__
+
+def recording_import(name, *args, **kwargs):
+    requested.add(name.split(".")[0])
+    return real_import(name, *args, **kwargs)
+
+before = set(sys.modules)
+builtins.__import__ = recording_import
+started = time.perf_counter()
+import {PACKAGE}
+elapsed = time.perf_counter() - started
+builtins.__import__ = real_import
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "modules": sorted(set(sys.modules) - before),
+    "requested": sorted(requested),
+}}))
+"""
+
+
+def probe() -> dict:
+    result = subprocess.run([sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS, help="median import time allowed, ms")
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.runs)]
+    median_ms = statistics.median(run["ms"] for run in runs)
+    modules = runs[-1]["modules"]
+    own = [module for module in modules if module.startswith(PACKAGE)]
+    print(f"{'import_ms':>16}: {median_ms:.1f} (budget {args.budget:g})")
+    print(f"{'modules':>16}: {len(modules)} ({len(own)} of the integration)")
+
+    problems = []
+    if median_ms > args.budget:
+        problems.append(f"import took {median_ms:.1f} ms, budget {args.budget:g} ms")
+    problems.extend(f"{module} loaded on import" for module in DEFERRED_MODULES if module in modules)
+    problems.extend(f"{name} imported on import" for name in DEFERRED_IMPORTS if name in runs[-1]["requested"])
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Replay recorded Smart Home Panel traffic through the message path.
+
+    python -m benchmarks.replay [--rounds N] [--devices N] [--repeat N] [--update-baseline]
+
+Every corpus message is decoded the way `MQTTClient` does it and applied with
+`SmartHomePanel._receive` and `_publish_snapshot` (quota) or parsed as a command
+reply (set_reply), with entities attached so the state write fan-out is included.
+The HTTP snapshot is replayed through `_calculate_and_publish`.
+
+Only the deterministic metrics, allocations and retained blocks per message, are
+gated against `baseline.json` with tight limits; the exit code is 1 when one is
+exceeded. Timings vary too much between runs on a shared machine to gate on, they
+are printed next to the baseline for reference.
+
+Message timestamps move forward with every round as in live traffic, so the
+time based state (energy integration, rolling windows) takes its normal path.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from . import hass_stub
+
+hass_stub.install()
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent))
+
+from custom_components.ecoflow_energy.api.message import ParseStats, parse_message  # noqa: E402
+from custom_components.ecoflow_energy.device.command import BaseEntityCommandResponse  # noqa: E402
+from custom_components.ecoflow_energy.device.smart_home_panel import SmartHomePanel  # noqa: E402
+
+CORPUS_DIR = ROOT / "corpus"
+BASELINE_FILE = ROOT / "baseline.json"
+SN_PREFIX = "SP10ZAW5ZE"
+
+# gated metrics: allowed relative growth, and allowed absolute growth
+ALLOCATION_TOLERANCE = 0.02
+RETAINED_BLOCKS_TOLERANCE = 0.1
+
+
+class ReplayApiClient:
+    def __init__(self, snapshot: dict) -> None:
+        self.snapshot = snapshot
+
+    async def get_device_info(self, sn: str):
+        return self.snapshot
+
+
+def load_corpus(rounds: int = 1) -> tuple[dict, list[list[tuple[str, bytes]]]]:
+    """Snapshot and the encoded messages of every round."""
+    snapshot = json.loads((CORPUS_DIR / "quota_all.json").read_text())
+    records = [json.loads(line) for line in (CORPUS_DIR / "mqtt.jsonl").read_text().splitlines() if line]
+    timestamps = [record["payload"]["timestamp"] for record in records if "timestamp" in record["payload"]]
+    duration = max(timestamps) - min(timestamps) + 1000
+    messages = []
+    for round_index in range(rounds):
+        encoded = []
+        for record in records:
+            payload = dict(record["payload"])
+            if "timestamp" in payload:
+                payload["timestamp"] += round_index * duration
+            encoded.append((record["kind"], json.dumps(payload).encode()))
+        messages.append(encoded)
+    return snapshot, messages
+
+
+async def setup_devices(hass, snapshot: dict, count: int) -> list[SmartHomePanel]:
+    devices = []
+    for index in range(count):
+        device = SmartHomePanel(sn=f"{SN_PREFIX}{index:06d}", name="Smart Home Panel", status=1,
+                                api_client=ReplayApiClient(snapshot))
+        await device.update_data()
+        device.configure(hass)
+        device._sensors()
+        device.switches()
+        device.selects()
+        devices.append(device)
+    return devices
+
+
+async def apply(device: SmartHomePanel, kind: str, payload: bytes, stats: ParseStats) -> int:
+    """Apply a message, returns the nanoseconds spent on the event loop side."""
+    message = parse_message(kind, device.sn, payload, stats)
+    if kind == "set_reply":
+        BaseEntityCommandResponse.from_dict(message.payload)
+        return 0
+    # the network thread and the loop side of a quota message, back to back
+    device._receive(message)
+    begin = time.perf_counter_ns()
+    device._publish_snapshot()
+    return time.perf_counter_ns() - begin
+
+
+async def replay_messages(devices, messages, rounds: int) -> dict:
+    stats = ParseStats()
+    latencies = []
+    loop_latencies = []
+    gc.collect()
+    started = time.perf_counter()
+    for round_messages in messages[:rounds]:
+        for device in devices:
+            for kind, payload in round_messages:
+                begin = time.perf_counter_ns()
+                loop_latencies.append(await apply(device, kind, payload, stats))
+                latencies.append(time.perf_counter_ns() - begin)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "messages": len(latencies),
+        "messages_per_sec": round(len(latencies) / elapsed),
+        "p50_us": round(latencies[len(latencies) // 2] / 1000, 2),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] / 1000, 2),
+        "mean_us": round(statistics.fmean(latencies) / 1000, 2),
+        "loop_mean_us": round(statistics.fmean(loop_latencies) / 1000, 2),
+    }
+
+
+async def measure_allocations(devices, messages) -> dict:
+    """Bytes allocated while applying a message, measured as the traced peak,
+    and memory blocks still held after a second, untraced pass."""
+    stats = ParseStats()
+    device = devices[0]
+    peaks = []
+    tracemalloc.start()
+    for kind, payload in messages:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        await apply(device, kind, payload, stats)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    tracemalloc.stop()
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    for kind, payload in messages:
+        await apply(device, kind, payload, stats)
+    gc.collect()
+    return {
+        "alloc_bytes_per_msg": round(statistics.fmean(peaks)),
+        "retained_blocks_per_msg": round((sys.getallocatedblocks() - blocks_before) / len(messages), 2),
+    }
+
+
+async def replay_snapshots(devices, rounds: int) -> dict:
+    # a snapshot is cheap compared to the message replay, run more of them
+    rounds *= 10
+    count = rounds * len(devices)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for device in devices:
+            device._calculate_and_publish()
+    elapsed = time.perf_counter() - started
+    return {"snapshots_per_sec": round(count / elapsed)}
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    limits = {
+        "alloc_bytes_per_msg": baseline["alloc_bytes_per_msg"] * (1 + ALLOCATION_TOLERANCE),
+        "retained_blocks_per_msg": max(baseline["retained_blocks_per_msg"], 0) + RETAINED_BLOCKS_TOLERANCE,
+    }
+    return [
+        f"{key}: {results[key]} (baseline {baseline[key]}, limit {round(limit, 2)})"
+        for key, limit in limits.items()
+        if results[key] > limit
+    ]
+
+
+async def run(args) -> int:
+    snapshot, messages = load_corpus(args.rounds * (args.repeat + 1))
+    hass = hass_stub.FakeHass(asyncio.get_running_loop())
+    devices = await setup_devices(hass, snapshot, args.devices)
+
+    # timings are the best of several repeats to keep scheduler noise out of the comparison,
+    # every repeat continues where the previous one stopped
+    message_runs = []
+    for repeat in range(args.repeat):
+        message_runs.append(await replay_messages(devices, messages[repeat * args.rounds:], args.rounds))
+    snapshot_runs = [await replay_snapshots(devices, args.rounds) for _ in range(args.repeat)]
+
+    results = max(message_runs, key=lambda run: run["messages_per_sec"])
+    results.update(await measure_allocations(devices, messages[-1]))
+    results.update(max(snapshot_runs, key=lambda run: run["snapshots_per_sec"]))
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    for key, value in results.items():
+        reference = f"  (baseline {baseline[key]})" if key in baseline else ""
+        print(f"{key:>26}: {value}{reference}")
+
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+        return 0
+
+    if not baseline:
+        print("No baseline, run with --update-baseline")
+        return 0
+
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update-baseline", action="store_true")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,28 @@
+import asyncio
 import logging
+import time
 
 from homeassistant.exceptions import ConfigEntryNotReady
 from .api.ecoflow_client import EcoFlowApiClient
+from .api.http_client import create_session
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
-from .const import DOMAIN
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE, EVENT_HOMEASSISTANT_STOP, Platform
+from homeassistant.core import Event, HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from .const import (
+    CONF_PERSISTENT_SESSION,
+    CONF_STALE_INTERVAL,
+    DEFAULT_PERSISTENT_SESSION,
+    DEFAULT_STALE_INTERVAL,
+    DOMAIN,
+    SIGNAL_DEVICE_READY,
+    STARTUP_CONCURRENCY,
+    STARTUP_FIRST_DEVICE_TIMEOUT,
+    STARTUP_RETRY_DELAYS,
+)
+from .cache import WarmStartCache
 from .coordinator import EcoflowCoordinatorDataUpdateCoordinator
+from .device import BaseDevice
 
 PLATFORMS = [
     Platform.SENSOR,
@@ -16,15 +32,19 @@ PLATFORMS = [
 
 _LOGGER = logging.getLogger(__name__)
 
+# hass.data[DOMAIN] holds one coordinator per entry id and the http session they share
+DATA_SESSION = "session"
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Hello World from a config entry."""
 
+    hass.data.setdefault(DOMAIN, {})
     keys = entry.data["keys"]
-    client = EcoFlowApiClient(keys["apikey"], keys["secret"], hass)
+    client = EcoFlowApiClient(keys["apikey"], keys["secret"], hass, session=_shared_session(hass))
+    entry.async_on_unload(client.close)
     if "creds" not in entry.data:
         try:
             creds = await client.login()
-            entry.data["creds"] = creds
             new_data = { "keys": keys, "creds": creds }
             hass.config_entries.async_update_entry(entry, data=new_data)
             client.set_mqtt_creds(creds)
@@ -35,22 +55,171 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         creds = entry.data["creds"]
         client.set_mqtt_creds(creds)
 
-    client.start()
+    def store_creds(creds: dict):
+        hass.config_entries.async_update_entry(entry, data={ "keys": keys, "creds": creds })
+
+    client.credentials_listener = store_creds
+    client.start(entry.options.get(CONF_PERSISTENT_SESSION, DEFAULT_PERSISTENT_SESSION))
 
-    if DOMAIN not in hass.data:
-        hass.data[DOMAIN] = {}
+    cache = WarmStartCache(hass, entry.entry_id)
+    await cache.async_load()
 
     coordinator = EcoflowCoordinatorDataUpdateCoordinator(hass, client)
-    await coordinator.async_config_entry_first_refresh()
+    started = time.monotonic()
+    devices_from_cache = bool(cache.devices)
+    if devices_from_cache:
+        # devices from the last run, the list is refreshed in the background
+        coordinator.async_set_updated_data(client.build_devices(cache.devices))
+        _LOGGER.info(f"Devices from cache: {len(coordinator.data)}")
+    else:
+        await coordinator.async_config_entry_first_refresh()
+        cache.set_devices(client.device_list_data)
+        _LOGGER.info(f"Devices found: {len(coordinator.data)} in {_elapsed_ms(started)} ms")
 
-    _LOGGER.info(f"Devices found: {len(coordinator.data)}")
+    stale_interval = entry.options.get(CONF_STALE_INTERVAL, DEFAULT_STALE_INTERVAL)
+    semaphore = asyncio.Semaphore(STARTUP_CONCURRENCY)
+    first_ready = asyncio.Event()
+    pending = 0
 
-    for device in coordinator.data:
-        await device.update_data()
-        device.configure(hass)
-        await device.connect_mqtt(hass)
+    async def start_device(device: BaseDevice):
+        nonlocal pending
+        from_cache = False
+        try:
+            from_cache = await _async_start_device_from_cache(hass, device, cache.quota.get(device.sn), stale_interval)
+            if from_cache or await _async_start_device(hass, device, semaphore, stale_interval):
+                coordinator.ready_devices.append(device)
+                async_dispatcher_send(hass, SIGNAL_DEVICE_READY.format(entry.entry_id), device)
+        finally:
+            pending -= 1
+            if coordinator.ready_devices or not pending:
+                first_ready.set()
+        if from_cache:
+            async with semaphore:
+                await device.coordinator.async_refresh_now()
+
+    def add_devices(devices: list[BaseDevice]):
+        nonlocal pending
+        for device in devices:
+            device.cache = cache
+            pending += 1
+            entry.async_create_background_task(hass, start_device(device), f"ecoflow start {device.sn}")
+
+    async def refresh_devices():
+        devices = await client.devices_list()
+        if devices is None:
+            return
+        cache.set_devices(client.device_list_data)
+        known = {device.sn for device in coordinator.data}
+        new_devices = [device for device in devices if device.sn not in known]
+        if new_devices:
+            _LOGGER.info(f"New devices found: {len(new_devices)}")
+            coordinator.data.extend(new_devices)
+            add_devices(new_devices)
+
+    add_devices(coordinator.data)
+    if not coordinator.data:
+        first_ready.set()
+    if devices_from_cache:
+        entry.async_create_background_task(hass, refresh_devices(), "ecoflow refresh devices")
 
+    try:
+        async with asyncio.timeout(STARTUP_FIRST_DEVICE_TIMEOUT):
+            await first_ready.wait()
+    except TimeoutError:
+        _LOGGER.warning("No device ready yet, their entities will be added once they are")
 
-    hass.data[DOMAIN]["coordinator"] = coordinator
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+    entry.async_on_unload(cache.async_flush)
+
+    async def flush_cache(event: Event):
+        # entries aren't unloaded on shutdown, save energy integrated since the last checkpoint
+        await cache.async_flush()
+
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, flush_cache))
+
+    hass.data[DOMAIN][entry.entry_id] = coordinator
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    _LOGGER.info(f"Platforms set up with {len(coordinator.ready_devices)}/{len(coordinator.data)} devices "
+                 f"in {_elapsed_ms(started)} ms")
+    return True
+
+
+def _shared_session(hass: HomeAssistant):
+    """One connection pool for all entries and reloads, closed on shutdown."""
+    session = hass.data[DOMAIN].get(DATA_SESSION)
+    if session is None or session.closed:
+        session = hass.data[DOMAIN][DATA_SESSION] = create_session()
+
+        async def close_session(event: Event):
+            await session.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close_session)
+    return session
+
+
+def _elapsed_ms(started: float) -> int:
+    return round((time.monotonic() - started) * 1000)
+
+
+async def _async_start_device_from_cache(hass: HomeAssistant, device: BaseDevice, snapshot,
+                                         stale_interval: int) -> bool:
+    if snapshot is None:
+        return False
+    started = time.monotonic()
+    if not device.load_snapshot(snapshot):
+        return False
+    device.configure(hass, stale_interval)
+    await device.connect_mqtt(hass)
+    _LOGGER.info(f"Device {device.sn} ready from cache in {_elapsed_ms(started)} ms")
     return True
+
+
+async def _async_start_device(hass: HomeAssistant, device: BaseDevice, semaphore: asyncio.Semaphore,
+                              stale_interval: int) -> bool:
+    """Load device data and connect it to mqtt, retrying offline devices in the background."""
+    for delay in [0, *STARTUP_RETRY_DELAYS]:
+        await asyncio.sleep(delay)
+        async with semaphore:
+            started = time.monotonic()
+            await device.update_data()
+            fetched = _elapsed_ms(started)
+            if not device.ready:
+                _LOGGER.warning(f"Device {device.sn} has no data after {fetched} ms, retrying")
+                continue
+            device.configure(hass, stale_interval)
+            await device.connect_mqtt(hass)
+            _LOGGER.info(f"Device {device.sn} ready in {_elapsed_ms(started)} ms "
+                         f"(quota {fetched} ms, configure and mqtt {_elapsed_ms(started) - fetched} ms)")
+            return True
+    _LOGGER.error(f"Device {device.sn} could not be loaded")
+    return False
+
+
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options to running devices."""
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    persistent_session = entry.options.get(CONF_PERSISTENT_SESSION, DEFAULT_PERSISTENT_SESSION)
+    if persistent_session != coordinator.api_client.mqtt_client.connection.persistent_session:
+        # the session type is fixed when connecting
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    stale_interval = entry.options.get(CONF_STALE_INTERVAL, DEFAULT_STALE_INTERVAL)
+    for device in coordinator.ready_devices:
+        device.coordinator.set_stale_interval(stale_interval)
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry, the shared http session stays open for the other entries."""
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+    for device in coordinator.data:
+        device.close()
+    # mqtt is stopped before returning so a reload never runs two clients with the same client id
+    await coordinator.api_client.close()
+    return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Drop the warm start cache of a removed entry."""
+    await WarmStartCache(hass, entry.entry_id).async_remove()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import random
+import time
+
+from typing import Any
+
+from .metrics import Histogram
+
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 120
+# time from a lost connection to the next accepted one, in seconds
+RECOVERY_BUCKETS_S = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+# CONNACK return codes of MQTT 3.1.1 for rejected credentials
+CONNACK_BAD_CREDENTIALS = 4
+CONNACK_NOT_AUTHORIZED = 5
+
+
+class Backoff:
+    """Exponential backoff with jitter, so clients don't reconnect in lockstep after a broker outage."""
+
+    def __init__(self, base: float = RECONNECT_MIN_DELAY, cap: float = RECONNECT_MAX_DELAY) -> None:
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        ceiling = min(self.cap, self.base * 2 ** self.attempt)
+        self.attempt += 1
+        return random.uniform(self.base, ceiling)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class ConnectionManager:
+    """Reconnect policy and metrics of the MQTT connection.
+
+    paho reconnects on its network thread; before every retry the client sets
+    the delay from `lost`. With a persistent session the broker keeps the
+    subscriptions, so they are only sent again when it reports no session.
+    """
+
+    def __init__(self, persistent_session: bool = False) -> None:
+        self.persistent_session = persistent_session
+        self.backoff = Backoff()
+        self.connected = False
+        self.disconnected_at: float | None = None
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.auth_failures = 0
+        self.credential_refreshes = 0
+        self.subscribes = 0
+        self.resumed_sessions = 0
+        self.recovery_s = Histogram(RECOVERY_BUCKETS_S)
+        self.refreshing = False
+
+    def accepted(self, session_present: bool) -> bool:
+        """Connection accepted, returns whether the subscriptions have to be sent."""
+        self.connected = True
+        self.connects += 1
+        self.backoff.reset()
+        if self.disconnected_at is not None:
+            self.reconnects += 1
+            self.recovery_s.observe(time.monotonic() - self.disconnected_at)
+            self.disconnected_at = None
+        if self.persistent_session and session_present:
+            self.resumed_sessions += 1
+            return False
+        self.subscribes += 1
+        return True
+
+    def lost(self) -> float:
+        """Connection lost or an attempt failed, returns the delay before the next attempt."""
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+        self.connected = False
+        self.failures += 1
+        return self.backoff.next_delay()
+
+    def rejected(self, rc: int) -> bool:
+        """Connection refused by the broker, returns whether credentials should be refreshed."""
+        if rc not in (CONNACK_BAD_CREDENTIALS, CONNACK_NOT_AUTHORIZED):
+            return False
+        self.auth_failures += 1
+        if self.refreshing:
+            return False
+        self.refreshing = True
+        return True
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "persistent_session": self.persistent_session,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "auth_failures": self.auth_failures,
+            "credential_refreshes": self.credential_refreshes,
+            "subscribes": self.subscribes,
+            "resumed_sessions": self.resumed_sessions,
+            "recovery_s": self.recovery_s.as_dict(),
+        }
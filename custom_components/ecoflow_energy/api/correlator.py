@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from asyncio import Future
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from .http_client import EcoflowException
+from .metrics import LATENCY_BUCKETS_MS, Histogram
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_COMMAND_TIMEOUT = 10
+MAX_IN_FLIGHT_PER_DEVICE = 8
+LATENCY_HISTORY = 32
+
+
+@dataclass
+class PendingCommand:
+    sn: str
+    future: Future[Any]
+    sent_at: float
+
+
+class CommandCorrelator:
+    """Matches set_reply messages to sent commands by command id.
+
+    Every command gets a timeout and is evicted when it is answered, timed out or
+    cancelled, so the pending map stays bounded by `max_in_flight` per device.
+    Must be used from the event loop, except `resolve` which is thread safe.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 timeout: float = DEFAULT_COMMAND_TIMEOUT,
+                 max_in_flight: int = MAX_IN_FLIGHT_PER_DEVICE) -> None:
+        self.loop = loop
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._pending = dict[int, PendingCommand]()
+        self._in_flight = dict[str, int]()
+        self.latencies = deque[tuple[int, str, float]](maxlen=LATENCY_HISTORY)
+        self.sent = 0
+        self.timeouts = 0
+        self.late_replies = 0
+        self.round_trip_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    def in_flight(self, sn: str) -> int:
+        return self._in_flight.get(sn, 0)
+
+    async def async_request(self, sn: str, command_id: int, send: Callable[[], Any]) -> Any:
+        if command_id in self._pending:
+            raise EcoflowException(f"Command {command_id} is already in flight")
+        if self.in_flight(sn) >= self.max_in_flight:
+            raise EcoflowException(f"Too many commands in flight for {sn}")
+
+        future = self.loop.create_future()
+        self._pending[command_id] = PendingCommand(sn, future, time.monotonic())
+        self._in_flight[sn] = self.in_flight(sn) + 1
+        try:
+            send()
+            self.sent += 1
+            async with asyncio.timeout(self.timeout):
+                return await future
+        except TimeoutError as error:
+            self.timeouts += 1
+            raise EcoflowException(f"No reply from {sn} for command {command_id} in {self.timeout}s") from error
+        finally:
+            self._evict(command_id)
+
+    def resolve(self, command_id: int, response: Any):
+        """Complete a pending command, may be called from any thread."""
+        self.loop.call_soon_threadsafe(self._resolve, command_id, response)
+
+    def _resolve(self, command_id: int, response: Any):
+        pending = self._pending.get(command_id)
+        if pending is None or pending.future.done():
+            self.late_replies += 1
+            return
+        latency = (time.monotonic() - pending.sent_at) * 1000
+        self.latencies.append((command_id, pending.sn, round(latency, 1)))
+        self.round_trip_ms.observe(latency)
+        _LOGGER.debug(f"Command {command_id} to {pending.sn} answered in {latency:.0f} ms")
+        pending.future.set_result(response)
+
+    def cancel_all(self):
+        """Fail every pending command, used when the connection is closed for good."""
+        for command_id, pending in self._pending.items():
+            if not pending.future.done():
+                pending.future.set_exception(EcoflowException(f"Connection closed, command {command_id} dropped"))
+
+    def _evict(self, command_id: int):
+        pending = self._pending.pop(command_id, None)
+        if pending is None:
+            return
+        count = self._in_flight.get(pending.sn, 0) - 1
+        if count > 0:
+            self._in_flight[pending.sn] = count
+        else:
+            self._in_flight.pop(pending.sn, None)
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "timeouts": self.timeouts,
+            "late_replies": self.late_replies,
+            "round_trip_ms": self.round_trip_ms.as_dict(),
+            "latency_ms": [
+                {"id": command_id, "sn": sn, "ms": latency} for command_id, sn, latency in self.latencies
+            ],
+        }
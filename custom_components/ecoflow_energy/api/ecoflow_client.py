@@ -3,13 +3,11 @@ from __future__ import annotations
 import logging
 import secrets
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Callable
 
-from dacite import from_dict
+from .http_client import BASE_URI, EcoFlowHttpClient
 
-from .http_client import EcoFlowHttpClient
-
-from ..device.smart_home_panel import SmartHomePanel
+from ..device import BaseDevice
 from ..device.command import CommandTarget
 
 from .ecoflow_mqtt import MQTTClient, EcoflowMqttInfo
@@ -40,12 +38,17 @@ class DeviceData:
 
 
 class EcoFlowApiClient:
-    def __init__(self, access_key: str, secret: str, hass):
-        self.client = EcoFlowHttpClient(access_key, secret)
+    def __init__(self, access_key: str, secret: str, hass, base_uri: str = BASE_URI, session=None,
+                 allow_plaintext_mqtt: bool = False):
+        self.client = EcoFlowHttpClient(access_key, secret, base_uri=base_uri, session=session)
         self.mqtt_info: EcoflowMqttInfo
         self.mqtt_client: MQTTClient = None
         self.mqtt_data = dict[str, DeviceData]()
+        self.device_list_data = list[dict[str, Any]]()
         self.hass = hass
+        self.allow_plaintext_mqtt = allow_plaintext_mqtt
+        # called with refreshed mqtt credentials, to store them with the config entry
+        self.credentials_listener: Callable[[dict], None] | None = None
 
     async def login(self) -> dict:
         resp = await self.client.get_data(MQTT_DATA)
@@ -53,31 +56,54 @@ class EcoFlowApiClient:
         data.update(resp["data"])
         return data
 
+    async def refresh_mqtt_info(self) -> EcoflowMqttInfo:
+        """New mqtt credentials, after the broker rejected the stored ones."""
+        creds = await self.login()
+        # the broker keeps a persistent session by client id
+        creds["client_id"] = self.mqtt_info.client_id
+        self.set_mqtt_creds(creds)
+        if self.credentials_listener is not None:
+            self.credentials_listener(creds)
+        return self.mqtt_info
+
     def set_mqtt_creds(self, creds):
         creds["port"] = int(creds["port"])
         self.__fill_mqtt_data(creds)
 
-    def start(self):
-        self._init_mqtt()
+    def start(self, persistent_session: bool = False):
+        self._init_mqtt(persistent_session)
+
+    async def close(self):
+        if self.mqtt_client is not None:
+            await self.mqtt_client.async_disconnect()
+            self.mqtt_client = None
+        await self.client.close()
 
     async def devices_list(self):
         try:
             resp = await self.client.get_data(DEVICE_LIST)
-            devices_data = []
-            for device in resp["data"]:
-                productName = device["productName"]
-                if productName == "Smart Home Panel":
-                    devices_data.append(
-                        SmartHomePanel(sn=device["sn"], name=productName, status=device["online"], api_client=self)
-                    )
-                else:
-                    _LOGGER.warning(f"Not supported {productName}")
-            return devices_data
+            self.device_list_data = resp["data"]
+            return self.build_devices(self.device_list_data)
         except Exception as error:
             _LOGGER.error(f"Error getting devices list {error}")
 
-    def _init_mqtt(self):
-        self.mqtt_client = MQTTClient(self.mqtt_info, self.hass)
+    def build_devices(self, device_list_data: list[dict[str, Any]]) -> list[BaseDevice]:
+        # device classes are loaded once there are devices to build
+        from ..device.models import DEVICE_MODELS
+
+        devices_data = []
+        for device in device_list_data:
+            productName = device["productName"]
+            model = DEVICE_MODELS.get(productName)
+            if model is not None:
+                devices_data.append(model.create(sn=device["sn"], status=device["online"], api_client=self))
+            else:
+                _LOGGER.warning(f"Not supported {productName}")
+        return devices_data
+
+    def _init_mqtt(self, persistent_session: bool):
+        self.mqtt_client = MQTTClient(self.mqtt_info, self.hass, persistent_session, self.refresh_mqtt_info,
+                                      allow_plaintext=self.allow_plaintext_mqtt)
         self.mqtt_client.connect()
 
     def __send_mqtt_command(self, sn, params) -> bool:
@@ -104,6 +130,14 @@ class EcoFlowApiClient:
         except Exception as error:
             _LOGGER.error(f"Error getting device {sn} info: {error}")
 
+    async def get_device_quota(self, sn: str, quotas: list[str]):
+        """Selected quota keys only, much smaller than quota/all."""
+        try:
+            resp = await self.client.send_request(QUOTA, "POST", body={"sn": sn, "params": {"quotas": quotas}})
+            return resp["data"]
+        except Exception as error:
+            _LOGGER.error(f"Error getting device {sn} quota: {error}")
+
     def __client_id(self):
         return f"energy_mqttx_{secrets.token_hex(4)}"
 
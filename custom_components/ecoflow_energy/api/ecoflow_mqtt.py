@@ -1,18 +1,19 @@
 from __future__ import annotations
 
-from asyncio import Future
 from dataclasses import dataclass
 from enum import IntEnum
-import json
 import logging
 import ssl
-from typing import Any
+from typing import Any, Awaitable, Callable
 from ..device.command import BaseEntityCommand, BaseEntityCommandResponse
+from .connection import RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY, ConnectionManager
+from .correlator import CommandCorrelator
+from .inbox import DeviceInbox
+from .message import EcoflowMqttMessage, ParseStats, parse_message
 from homeassistant.components.mqtt.async_client import AsyncMQTTClient
 
 
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers.dispatcher import async_dispatcher_send, dispatcher_send
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,28 +35,60 @@ class EcoflowMqttInfo:
 class MQTTClient:
     """Handles MQTT communication."""
 
-    def __init__(self, mqtt_info: EcoflowMqttInfo, hass: HomeAssistant) -> None:
+    def __init__(self, mqtt_info: EcoflowMqttInfo, hass: HomeAssistant, persistent_session: bool = False,
+                 refresh_credentials: Callable[[], Awaitable[EcoflowMqttInfo]] | None = None,
+                 allow_plaintext: bool = False) -> None:
         self.credentials = mqtt_info
+        # local test brokers only, the cloud connection always uses TLS
+        self.allow_plaintext = allow_plaintext
         self.__client: AsyncMQTTClient = None
         self.hass = hass
-        self.callback_holder = dict[int, Future[Any]]()
-        self.device_resub = dict[str, Any]()
+        self.connection = ConnectionManager(persistent_session)
+        self.refresh_credentials = refresh_credentials
+        self.correlator = CommandCorrelator(hass.loop)
+        self.device_inboxes = dict[str, DeviceInbox]()
+        self.topic_handlers = {
+            QUOTA_TOPIC_SUFFIX: self._route_quota,
+            COMMAND_REPLY_TOPIC_SUFFIX: self._route_set_reply,
+        }
+        self.parse_stats = ParseStats()
+        self.messages_by_kind = dict.fromkeys(self.topic_handlers, 0)
+        self.messages_by_device = dict[str, int]()
+        self._closing = False
 
     def connect(self):
         """Connect to the MQTT broker."""
-        self.__client = AsyncMQTTClient(client_id=self.credentials.client_id, reconnect_on_failure=True, clean_session=True)
+        # a persistent session is kept by the broker under the client id, which stays the same across restarts
+        self.__client = AsyncMQTTClient(client_id=self.credentials.client_id, reconnect_on_failure=True,
+                                        clean_session=not self.connection.persistent_session)
         self.__client.setup()
         self.__client.username_pw_set(self.credentials.username, self.credentials.password)
-        self.__client.tls_set(certfile=None, keyfile=None, cert_reqs=ssl.CERT_REQUIRED)
-        self.__client.tls_insecure_set(False)
+        self.__client.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        if not (self.allow_plaintext and self.credentials.protocol == "mqtt"):
+            # the protocol comes from the certification response, it never turns TLS off on its own
+            self.__client.tls_set(certfile=None, keyfile=None, cert_reqs=ssl.CERT_REQUIRED)
+            self.__client.tls_insecure_set(False)
         self.__client.on_message = self._on_message
         self.__client.on_connect = self._on_connect
         self.__client.on_connect_fail = self.on_connect_fail
         self.__client.on_disconnect = self._on_disconnect
         self.__client.on_socket_close = self._on_socket_closed
-        self.__client.connect(self.credentials.url, int(self.credentials.port), keepalive=15)
+        # connected by the network thread, a broker that is slow or down doesn't block the loop,
+        # failed attempts are retried through on_connect_fail with the connection backoff
+        self.__client.connect_async(self.credentials.url, int(self.credentials.port), keepalive=15)
         self.__client.loop_start()
 
+    async def async_disconnect(self):
+        """Stop the network thread and fail commands still waiting for a reply."""
+        self._closing = True
+        self.device_inboxes.clear()
+        self.correlator.cancel_all()
+        if self.__client is not None:
+            self.__client.disconnect()
+            # loop_stop joins the paho thread
+            await self.hass.async_add_executor_job(self.__client.loop_stop)
+            self.__client = None
+
     def send_command(self, sn, command: BaseEntityCommand):
         topic = f"/open/{self.credentials.username}/{sn}/{COMMAND_TOPIC_SUFFIX}"
         self.__client.publish(topic, command.to_message())
@@ -63,61 +96,112 @@ class MQTTClient:
     async def async_send_command(self, sn, command: BaseEntityCommand) -> BaseEntityCommandResponse:
         topic = f"/open/{self.credentials.username}/{sn}/{COMMAND_TOPIC_SUFFIX}"
 
-        command_future = self.hass.loop.create_future()
+        message = command.to_message()
+        return await self.correlator.async_request(sn, command.id, lambda: self.__client.publish(topic, message))
 
-        self.callback_holder[command.id] = command_future
-        self.__client.publish(topic, command.to_message())
+    def subscribe_to_device(self, sn, apply: Callable[[EcoflowMqttMessage], bool],
+                            drain: Callable[[], Any]) -> DeviceInbox:
+        """Apply messages of a device with apply on this thread, drain them on the loop.
 
-        return await command_future
+        Topics of all devices are covered by the account wildcard subscription.
+        """
+        inbox = DeviceInbox(self.hass.loop, apply, drain)
+        self.device_inboxes[sn] = inbox
+        return inbox
 
-    def subscribe_to_device(self, sn, topic_key):
-        """Subscribe to a specific device's MQTT topic."""
+    def _subscribe_all(self):
+        """All topics of the account in one SUBSCRIBE.
+
+        A persistent session subscribes with QoS 1, so the broker queues heartbeats while disconnected.
+        """
         user_name = self.credentials.username
-        topics = [f"/open/{user_name}/{sn}/{QUOTA_TOPIC_SUFFIX}", f"/open/{user_name}/{sn}/{COMMAND_REPLY_TOPIC_SUFFIX}"]
-        self.device_resub[sn] = 1
-
-        def message_handler(client, userdata, message):
-            dispatcher_send(self.hass, f"device_update_{sn}", message)
-            try:
-                if message.topic == f"/open/{user_name}/{sn}/{COMMAND_REPLY_TOPIC_SUFFIX}":
-                    value_str = message.payload.decode("utf-8", errors='ignore')
-                    value = json.loads(value_str)
-                    response_command = BaseEntityCommandResponse.from_dict(value)
-                    if response_command.id in self.callback_holder:
-                        future_response = self.callback_holder.pop(response_command.id)
-                        if not future_response.done():
-                            self.hass.loop.call_soon_threadsafe(future_response.set_result, response_command)
-
-            except UnicodeDecodeError as error:
-                _LOGGER.warning(f"UnicodeDecodeError: {error}. Trying to load json.")
-            except Exception as error:
-                _LOGGER.warning(f"Exception: {error}. Trying to load json.")
-
-        for topic in topics:
-            self.__client.subscribe(topic)
-            self.__client.message_callback_add(topic, message_handler)
+        qos = 1 if self.connection.persistent_session else 0
+        topics = [(f"/open/{user_name}/+/{suffix}", qos) for suffix in self.topic_handlers]
+        self.__client.subscribe(topics)
+
+    def _route_quota(self, message: EcoflowMqttMessage):
+        inbox = self.device_inboxes.get(message.sn)
+        if inbox is not None:
+            inbox.put(message)
+
+    def _route_set_reply(self, message: EcoflowMqttMessage):
+        try:
+            response_command = BaseEntityCommandResponse.from_dict(message.payload)
+            self.correlator.resolve(response_command.id, response_command)
+        except Exception as error:
+            _LOGGER.warning(f"Can't parse set_reply of {message.sn}: {error}")
+
+    def _on_message(self, client, userdata, message):
+        # /open/{user}/{sn}/{kind}
+        parts = message.topic.split("/")
+        if len(parts) != 5:
+            return
+        kind = parts[4]
+        route = self.topic_handlers.get(kind)
+        if route is None:
+            return
+        sn = parts[3]
+        self.messages_by_kind[kind] += 1
+        self.messages_by_device[sn] = self.messages_by_device.get(sn, 0) + 1
+        # decoded once here on the mqtt thread, handlers get the parsed message
+        parsed = parse_message(kind, sn, message.payload, self.parse_stats)
+        if parsed is None:
+            _LOGGER.warning(f"Can't decode mqtt message from {message.topic}")
+            return
+        route(parsed)
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "devices": len(self.device_inboxes),
+            "connection": self.connection.diagnostics(),
+            "inboxes": {sn: inbox.diagnostics() for sn, inbox in self.device_inboxes.items()},
+            "commands": self.correlator.diagnostics(),
+            "messages_by_kind": self.messages_by_kind,
+            "messages_by_device": self.messages_by_device,
+            "parse": self.parse_stats.as_dict(),
+        }
+
+    async def __async_refresh_credentials(self):
+        try:
+            credentials = await self.refresh_credentials()
+        except Exception as error:
+            _LOGGER.warning(f"Can't refresh mqtt credentials: {error}")
+            return
+        finally:
+            self.connection.refreshing = False
+        self.credentials = credentials
+        self.connection.credential_refreshes += 1
+        if self.__client is not None:
+            # used by the next reconnect of the network thread
+            self.__client.username_pw_set(credentials.username, credentials.password)
+        _LOGGER.info("Ecoflow mqtt credentials refreshed")
+
+    def __retry_later(self, client):
+        delay = self.connection.lost()
+        client.reconnect_delay_set(delay, delay)
+        return delay
 
     @callback
     def _on_connect(self, client, userdata, flags, rc):
         _LOGGER.info(f"Ecoflow mqtt connected {rc}")
         if rc == 0:
-            sn_list = self.device_resub.keys()
-            for device_sn in sn_list:
-                self.subscribe_to_device(device_sn, "")
-
-    @callback
-    def on_connect_fail(self):
-        _LOGGER.error("Ecoflow mqtt not connected")
+            if self.connection.accepted(bool(flags.get("session present"))):
+                self._subscribe_all()
+            return
+        if self.connection.rejected(rc) and self.refresh_credentials is not None:
+            self.hass.add_job(self.__async_refresh_credentials)
 
     @callback
-    def _on_message(self, client, userdata, message):
-        _LOGGER.info("Message receive _on_message")
+    def on_connect_fail(self, client, userdata):
+        delay = self.__retry_later(client)
+        _LOGGER.error(f"Ecoflow mqtt not connected, retrying in {delay:.1f} s")
 
     @callback
     def _on_disconnect(self, client, userdata, reasonCode):
-        _LOGGER.info(f"I _on_disconnect {reasonCode}")
-        if reasonCode == 16:
-            self.__client.loop_start()
+        if self._closing:
+            return
+        delay = self.__retry_later(client)
+        _LOGGER.info(f"Ecoflow mqtt disconnected {reasonCode}, reconnecting in {delay:.1f} s")
 
     @callback
     def _on_socket_closed(self, client, userdata, socket):
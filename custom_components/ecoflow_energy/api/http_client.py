@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import hmac
 import logging
+import math
 import random
 import time
 
@@ -12,19 +14,54 @@ from typing import Any
 import aiohttp
 from aiohttp import ClientResponse
 
-logging.basicConfig(
-    level=logging.INFO,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",  # Log format
-)
+from .metrics import LATENCY_BUCKETS_MS, Histogram
+from .rate_limiter import SHARED_RATE_LIMITER, TokenBucketRateLimiter
+
 _LOGGER = logging.getLogger(__name__)
 BASE_URI = "https://api-e.ecoflow.com/"
 
+CONNECTION_LIMIT_PER_HOST = 4
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
+
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+# longest Retry-After honoured, it holds every entry sharing the rate limiter
+RETRY_AFTER_MAX_DELAY = 120
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
 
 class EcoflowException(Exception):
     def __init__(self, *args, **kwargs):
         super().__init__(args, kwargs)
 
 
+class EcoflowRetryableException(EcoflowException):
+    def __init__(self, message, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, capped at RETRY_AFTER_MAX_DELAY."""
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        return None
+    if not math.isfinite(delay):
+        return None
+    return min(max(delay, 0), RETRY_AFTER_MAX_DELAY)
+
+
 def concat_params(params: dict[str, str]) -> str:
     if not params:
         return ""
@@ -32,31 +69,114 @@ def concat_params(params: dict[str, str]) -> str:
     return "&".join(param_strings)
 
 
+def flatten_params(data: Any, prefix: str = "") -> dict[str, Any]:
+    """Flatten a json body the way the Open API signs it: `a.b`, `a[0]`, sorted by key."""
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten_params(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            flat.update(flatten_params(value, f"{prefix}[{index}]"))
+    else:
+        flat[prefix] = data
+    return dict(sorted(flat.items()))
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Keep-alive session, may be shared by the clients of several config entries."""
+    connector = aiohttp.TCPConnector(limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                                     ttl_dns_cache=DNS_CACHE_TTL,
+                                     keepalive_timeout=KEEPALIVE_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+
 class EcoFlowHttpClient:
-    def __init__(self, apikey, secret):
+    def __init__(self, apikey, secret, rate_limiter: TokenBucketRateLimiter = SHARED_RATE_LIMITER,
+                 base_uri: str = BASE_URI, session: aiohttp.ClientSession | None = None):
         self._apikey = apikey
         self._secret = secret
+        self.base_uri = base_uri
         self.devices: dict[str, Any] = {}
-        self._nonce = str(random.randint(10000, 1000000))
-        self._timestamp = str(int(time.time() * 1000))
+        self._session = session
+        # a session passed in is owned by the caller and left open on close
+        self._owns_session = session is None
+        self.rate_limiter = rate_limiter
+        self.retried = 0
+        self.errors = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """Keep-alive session, created on first use unless one was passed in."""
+        if self._session is None or self._session.closed:
+            self._session = create_session()
+            self._owns_session = True
+        return self._session
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "retried": self.retried,
+            "errors": self.errors,
+            "latency_ms": self.latency_ms.as_dict(),
+            "rate_limiter": self.rate_limiter.diagnostics(),
+        }
+
+    async def close(self):
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def get_data(self, endpoint: str, params: dict[str, str] = None):
         return await self.send_request(endpoint, "get", params)
 
-    async def send_request(self, endpoint: str, method: str, params: dict[str, str] = None):
-        async with aiohttp.ClientSession() as session:
-            params = params or {}
-            params_str = concat_params(params)
-            headers = self.__headers(params_str)
-            resp = await session.request(method,
-                                         f"{BASE_URI}{endpoint}?{params_str}",
-                                         headers=headers)
-
-            self._nonce = str(random.randint(10000, 1000000))
-            self._timestamp = str(int(time.time() * 1000))
-            return await self.__get_response(resp)
+    async def send_request(self, endpoint: str, method: str, params: dict[str, str] = None,
+                           body: dict[str, Any] = None):
+        params = params or {}
+        params_str = concat_params(params)
+        sign_str = concat_params(flatten_params(body)) if body else params_str
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                return await self.__send(endpoint, method, params_str, sign_str, body)
+            except EcoflowRetryableException as error:
+                if attempt >= MAX_RETRIES:
+                    raise
+                if error.retry_after is not None:
+                    self.rate_limiter.throttle(error.retry_after)
+                    delay = error.retry_after
+                else:
+                    delay = retry_delay(attempt)
+                attempt += 1
+                self.retried += 1
+                _LOGGER.debug(f"Retrying {endpoint} in {delay:.1f}s ({attempt}/{MAX_RETRIES}): {error}")
+                await asyncio.sleep(delay)
+
+    async def __send(self, endpoint: str, method: str, params_str: str, sign_str: str,
+                     body: dict[str, Any] | None):
+        session = self.__get_session()
+        # signed right before sending so nonce/timestamp are fresh for every request
+        headers = self.__headers(sign_str)
+        started = time.monotonic()
+        try:
+            async with session.request(method,
+                                       f"{self.base_uri}{endpoint}?{params_str}",
+                                       headers=headers,
+                                       json=body) as resp:
+                return await self.__get_response(resp)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            self.errors += 1
+            raise EcoflowRetryableException(f"Request to {endpoint} failed: {error}") from error
+        except EcoflowException:
+            self.errors += 1
+            raise
+        finally:
+            self.latency_ms.observe((time.monotonic() - started) * 1000)
 
     async def __get_response(self, resp: ClientResponse):
+        if resp.status in RETRYABLE_STATUSES:
+            raise EcoflowRetryableException(f"Got HTTP status code {resp.status}: {resp.reason}",
+                                            parse_retry_after(resp.headers.get("Retry-After")))
         if resp.status != 200:
             raise EcoflowException(f"Got HTTP status code {resp.status}: {resp.reason}")
 
@@ -72,17 +192,19 @@ class EcoFlowHttpClient:
         return json_resp
 
     def __headers(self, params: str):
-        sign = self.__sign(params)
+        nonce = str(random.randint(10000, 1000000))
+        timestamp = str(int(time.time() * 1000))
+        sign = self.__sign(params, nonce, timestamp)
         headers = {
             'accessKey': self._apikey,
-            'nonce': self._nonce,
-            'timestamp': self._timestamp,
+            'nonce': nonce,
+            'timestamp': timestamp,
             'sign': sign
         }
         return headers
 
-    def __sign(self, query_params):
-        target_str = f"accessKey={self._apikey}&nonce={self._nonce}&timestamp={self._timestamp}"
+    def __sign(self, query_params, nonce, timestamp):
+        target_str = f"accessKey={self._apikey}&nonce={nonce}&timestamp={timestamp}"
         if query_params:
             target_str = query_params + "&" + target_str
         return self.__encrypt(target_str)
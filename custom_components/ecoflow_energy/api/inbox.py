@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+
+from typing import Any, Callable
+
+from .message import EcoflowMqttMessage
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceInbox:
+    """Handoff of one device's telemetry from the paho thread to the event loop.
+
+    Messages are applied to the device data on the network thread by `apply`,
+    which returns whether the data changed hands. The loop is called once for all
+    messages applied since its last `drain`, which snapshots the data, so a burst
+    costs one snapshot and one entity update whatever the message rate.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 apply: Callable[[EcoflowMqttMessage], bool],
+                 drain: Callable[[], Any]) -> None:
+        self.loop = loop
+        self.apply = apply
+        self.drain = drain
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self.received = 0
+        # messages that raised while applied
+        self.failures = 0
+        # messages folded into a snapshot already waiting for the loop
+        self.coalesced = 0
+        self.published = 0
+
+    def put(self, message: EcoflowMqttMessage):
+        """Apply a message and schedule a drain, called from the network thread."""
+        self.received += 1
+        try:
+            applied = self.apply(message)
+        except Exception as error:
+            self.failures += 1
+            _LOGGER.warning(f"Exception: {error}. Can't apply message of {message.sn}.")
+            return
+        if not applied:
+            return
+        with self._lock:
+            if self._scheduled:
+                self.coalesced += 1
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self._lock:
+            # messages applied from here on schedule the next drain
+            self._scheduled = False
+        self.published += 1
+        self.drain()
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "received": self.received,
+            "failures": self.failures,
+            "coalesced": self.coalesced,
+            "published": self.published,
+        }
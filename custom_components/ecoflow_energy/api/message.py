@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+import time
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from .metrics import LATENCY_BUCKETS_US, Histogram
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+
+class ParseStats:
+    def __init__(self) -> None:
+        self.errors = 0
+        self.parse_us = Histogram(LATENCY_BUCKETS_US)
+
+    def add(self, elapsed_ns: int):
+        self.parse_us.observe(elapsed_ns / 1000)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "backend": JSON_BACKEND,
+            "errors": self.errors,
+            "parse_us": self.parse_us.as_dict(),
+        }
+
+
+@dataclass
+class EcoflowMqttMessage:
+    """Mqtt message decoded once, shared by the command correlator and device parsers."""
+    kind: str
+    sn: str
+    payload: dict[str, Any]
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+def decode_payload(payload: bytes) -> dict[str, Any]:
+    try:
+        return _loads(payload)
+    except ValueError:
+        return json.loads(payload.decode("utf-8", errors='ignore'))
+
+
+def parse_message(kind: str, sn: str, payload: bytes, stats: ParseStats) -> EcoflowMqttMessage | None:
+    started = time.perf_counter_ns()
+    try:
+        value = decode_payload(payload)
+    except ValueError:
+        stats.errors += 1
+        return None
+    stats.add(time.perf_counter_ns() - started)
+    if not isinstance(value, dict):
+        return None
+    return EcoflowMqttMessage(kind=kind, sn=sn, payload=value, params=value.get("params") or {})
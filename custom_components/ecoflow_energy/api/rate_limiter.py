@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from typing import Any
+
+DEFAULT_RATE = 5
+DEFAULT_BURST = 10
+
+
+class TokenBucketRateLimiter:
+    """Token bucket shared by all http clients, so devices of all config entries
+    together stay under the Open API request rate."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self.acquired = 0
+        self.queued = 0
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        queued = False
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self._blocked_until - now
+            if wait <= 0:
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if not queued:
+                queued = True
+                self.queued += 1
+            await asyncio.sleep(wait)
+
+    def throttle(self, delay: float):
+        """Hold all requests for delay seconds, used when the server asks to slow down."""
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        self._tokens = 0
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "throttled": self.throttled,
+        }
+
+
+SHARED_RATE_LIMITER = TokenBucketRateLimiter()
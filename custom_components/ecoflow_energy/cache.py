@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 60
+
+
+class WarmStartCache:
+    """Device list, last quota snapshot and energy totals per device, persisted per config entry.
+
+    Lets setup build entities right away after a restart, data is refreshed
+    over HTTP/MQTT in the background.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = Store[dict[str, Any]](hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.devices = list[dict[str, Any]]()
+        self.quota = dict[str, dict[str, Any]]()
+        self.energy = dict[str, dict[str, float]]()
+        # live energy totals per device, read whenever the store is written
+        self._energy_sources = dict[str, Callable[[], dict[str, float]]]()
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        self.devices = data.get("devices", [])
+        self.quota = data.get("quota", {})
+        self.energy = data.get("energy", {})
+
+    def set_devices(self, devices: list[dict[str, Any]]):
+        self.devices = devices
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def set_quota(self, sn: str, response_data: dict[str, Any]):
+        self.quota[sn] = response_data
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def set_energy(self, sn: str, totals: dict[str, float]):
+        self.energy[sn] = totals
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def track_energy(self, sn: str, totals: Callable[[], dict[str, float]]):
+        """Save the totals returned by `totals` with every write, including the final one on shutdown."""
+        self._energy_sources[sn] = totals
+
+    async def async_flush(self):
+        """Write pending changes now instead of after the save delay."""
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+    def _data_to_save(self) -> dict[str, Any]:
+        for sn, totals in self._energy_sources.items():
+            self.energy[sn] = totals()
+        return {"devices": self.devices, "quota": self.quota, "energy": self.energy}
@@ -1,6 +1,7 @@
 from .api.ecoflow_client import EcoFlowApiClient
 from homeassistant import config_entries
-from .const import DOMAIN  # pylint:disable=unused-import
+from homeassistant.core import callback
+from .const import CONF_PERSISTENT_SESSION, CONF_STALE_INTERVAL, DEFAULT_PERSISTENT_SESSION, DEFAULT_STALE_INTERVAL, DOMAIN  # pylint:disable=unused-import
 import voluptuous as vol
 
 import logging
@@ -11,6 +12,11 @@ class EcoflowEnergyConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Example config flow."""
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return EcoflowEnergyOptionsFlow(config_entry)
+
     async def async_step_user(self, user_input):
         data_schema = {
             vol.Required("apikey"): str,
@@ -21,9 +27,15 @@ class EcoflowEnergyConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             apikey = user_input["apikey"]
             secret = user_input["secret"]
+            # one entry per account, several accounts can be added
+            await self.async_set_unique_id(apikey)
+            self._abort_if_unique_id_configured()
 
             client = EcoFlowApiClient(apikey, secret, None)
-            mqtt_info = await client.login()
+            try:
+                mqtt_info = await client.login()
+            finally:
+                await client.close()
             if mqtt_info:
                 data = { "keys": user_input, "creds": mqtt_info }
                 _LOGGER.info("Load from config")
@@ -31,4 +43,22 @@ class EcoflowEnergyConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             else:
                 errors["base"] = "Wrong credentials"
 
-        return self.async_show_form(step_id="user", data_schema=vol.Schema(data_schema), errors=errors)
\ No newline at end of file
+        return self.async_show_form(step_id="user", data_schema=vol.Schema(data_schema), errors=errors)
+
+
+class EcoflowEnergyOptionsFlow(config_entries.OptionsFlow):
+    def __init__(self, config_entry) -> None:
+        self._entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self._entry.options
+        data_schema = {
+            vol.Required(CONF_STALE_INTERVAL,
+                         default=options.get(CONF_STALE_INTERVAL, DEFAULT_STALE_INTERVAL)): vol.All(int, vol.Range(min=10)),
+            vol.Required(CONF_PERSISTENT_SESSION,
+                         default=options.get(CONF_PERSISTENT_SESSION, DEFAULT_PERSISTENT_SESSION)): bool,
+        }
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(data_schema))
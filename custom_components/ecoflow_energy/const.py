@@ -1,2 +1,17 @@
 DOMAIN = "ecoflow_energy"
-ECOFLOW_DOMAIN = "ecoflow.com"
\ No newline at end of file
+ECOFLOW_DOMAIN = "ecoflow.com"
+
+CONF_STALE_INTERVAL = "stale_interval"
+DEFAULT_STALE_INTERVAL = 60
+
+# broker keeps subscriptions and queues heartbeats over reconnects
+CONF_PERSISTENT_SESSION = "persistent_session"
+DEFAULT_PERSISTENT_SESSION = False
+
+# devices initialized in parallel during setup
+STARTUP_CONCURRENCY = 4
+# how long setup waits for the first device before platforms are set up anyway
+STARTUP_FIRST_DEVICE_TIMEOUT = 30
+STARTUP_RETRY_DELAYS = [30, 60, 120, 300]
+
+SIGNAL_DEVICE_READY = "ecoflow_energy_device_ready_{}"
@@ -14,10 +14,14 @@ class EcoflowCoordinatorDataUpdateCoordinator(DataUpdateCoordinator[list[BaseDev
             # update_interval=timedelta(seconds=30),  # Poll every 30 seconds
         )
         self.api_client = api_client
+        # devices with loaded data, platforms create entities only for these
+        self.ready_devices = list[BaseDevice]()
 
     async def _async_update_data(self):
         try:
             devices = await self.api_client.devices_list()
-            return devices
         except Exception as err:
-            raise UpdateFailed(f"Error updating data: {err}")
\ No newline at end of file
+            raise UpdateFailed(f"Error updating data: {err}")
+        if devices is None:
+            raise UpdateFailed("Devices list is not available")
+        return devices
\ No newline at end of file
@@ -1,94 +1,202 @@
+from __future__ import annotations
+
 import logging
+import threading
 import time
 
-from datetime import timedelta
+from array import array
 from dataclasses import dataclass
+from datetime import timedelta
 from enum import StrEnum
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.components.switch import SwitchEntity
-from homeassistant.components.select import SelectEntity
+from homeassistant.core import callback
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
+from ..api.message import EcoflowMqttMessage
+from ..api.metrics import LATENCY_BUCKETS_US, Histogram
+from ..const import DEFAULT_STALE_INTERVAL
+from .command import BaseEntityCommand, CommandTarget
+from .rolling import RollingChannel, RollingGroup
+from .scheduler import CommandScheduler
+
+if TYPE_CHECKING:
+    from homeassistant.components.sensor import SensorEntity
+    from homeassistant.components.switch import SwitchEntity
+    from homeassistant.components.select import SelectEntity
+
 _LOGGER = logging.getLogger(__name__)
 
 class EntitySensorKey(StrEnum):
     BREAKER = "breaker_"
     SHP_GRID = "shp_grid"
-    BATTERIES_COUNT = "batteries_count"
     BATTERY = "battery_"
 
 class EntityUpdateCoordinator(DataUpdateCoordinator):
-    def __init__(self, hass, device) -> None:
+    """Push driven coordinator.
+
+    Entities are updated from mqtt messages via `async_push_update`. The scheduled
+    refresh is only a staleness fallback: every push resets the refresh timer, so
+    `quota/all` is requested only when no heartbeat arrived for `stale_interval` seconds.
+    """
+
+    def __init__(self, hass, device, stale_interval: int = DEFAULT_STALE_INTERVAL) -> None:
         """Initialize the coordinator."""
         super().__init__(hass,
                          _LOGGER, name="Ecoflow update coordinator",
                          always_update=True,
-                         update_interval=timedelta(seconds=5),
+                         update_interval=timedelta(seconds=stale_interval),
         )
         self.device = device
         self.last_update = self.current_milli_time()
-        self.fetch_interval_millis = 30000
 
     def current_milli_time(self):
         return round(time.time() * 1000)
 
+    def set_stale_interval(self, stale_interval: int):
+        self.update_interval = timedelta(seconds=stale_interval)
+
     def should_refetch(self) -> bool:
         current_millis = self.current_milli_time()
         last_millis = self.last_update
-        return (current_millis - last_millis) >= self.fetch_interval_millis
+        return (current_millis - last_millis) >= self.update_interval.total_seconds() * 1000
 
     async def async_added_to_hass(self):
         """Call when entity is added to hass."""
         await self.device.update_data()
 
+    @callback
+    def async_push_update(self):
+        """Notify entities about data received from mqtt."""
+        self.last_update = self.current_milli_time()
+        self.async_set_updated_data(self.device.data)
+
+    async def async_refresh_now(self):
+        """Refresh over http right away, used after a start from cached data."""
+        await self.device.update_data()
+        self.last_update = self.current_milli_time()
+        self.async_set_updated_data(self.device.data)
+
     async def _async_update_data(self):
         if self.should_refetch():
+            _LOGGER.debug(f"No heartbeat from {self.device.sn}, refreshing over http")
             await self.device.update_data()
             self.last_update = self.current_milli_time()
         return self.device.data
 
-@dataclass
-class DataValue:
-    value: Any
-    name: str
-    custom_attributes: Any
-    default_visible = True
-
-    def __init__(self, name, value, default_visible = True, custom_attributes = None) -> None:
-        self.name = name
-        self.value = value
-        self.custom_attributes = custom_attributes
-        self.default_visible = default_visible
+@dataclass(frozen=True, slots=True)
+class TelemetrySnapshot:
+    """Immutable copy of the data slots at one generation, what entities read."""
+    version: int
+    values: tuple[Any, ...]
+    # read only view of the generations, copied in C
+    generations: memoryview
 
-    def set_visibility(self, visible):
-        self.default_visible = visible
+EMPTY_SNAPSHOT = TelemetrySnapshot(0, (), memoryview(b"").cast("Q"))
 
-    def set_custom_attr(self, attrs):
-        self.custom_attributes = attrs
+class DataHolder:
+    """Telemetry of a device.
 
-    def set_value(self, value):
-        self.value = value
+    Every field is a fixed slot allocated once at device setup. Parsers write values
+    in place with `set` and entities bind to their slot index, so applying a
+    message doesn't allocate per field. Writers hold `lock`, as mqtt messages are
+    applied on the network thread, and hand entities an immutable `snapshot`.
+    """
 
-class DataHolder:
     def __init__(self) -> None:
         self.data_set_reply = {}
         self.response_data = {}
 
-        self.mapped_data = dict[str, dict[str, DataValue]]()
         self.mapped_custom_attrs = dict[str, Any]()
         self.entity_visibility = dict[str, bool]()
 
         self.last_update = 0
 
+        self.slots = dict[str, dict[str, int]]()
+        self.names = list[str]()
+        self.values = list[Any]()
+        # generation of the last change per slot
+        self.generations = array("Q")
+
+        self.generation = 0
+        self.lock = threading.Lock()
+        # latest snapshot taken, and the one entities read, swapped on the loop
+        self._published = EMPTY_SNAPSHOT
+        self.snapshot = EMPTY_SNAPSHOT
+        self.state_writes = 0
+        self.suppressed_writes = 0
+        # changes held back by an entity publish policy
+        self.throttled_writes = 0
+
+    @property
+    def allocated(self) -> bool:
+        return len(self.values) > 0
+
+    def allocate(self, group: str, key: str, name: str) -> int:
+        slots = self.slots.setdefault(group, {})
+        slot = slots.get(key)
+        if slot is None:
+            slot = len(self.values)
+            slots[key] = slot
+            self.names.append(name)
+            self.values.append(None)
+            self.generations.append(0)
+        return slot
+
+    def slot(self, group: str, key: str) -> int | None:
+        return self.slots.get(group, {}).get(key)
+
+    def has_value(self, group: str, key: str) -> bool:
+        slot = self.slot(group, key)
+        return slot is not None and self.values[slot] is not None
+
+    def set(self, slot: int, value: Any):
+        """Store value, keeping the slot generation if the value did not change."""
+        if self.values[slot] == value:
+            return
+        self.generation += 1
+        self.generations[slot] = self.generation
+        self.values[slot] = value
+
+    def publish(self) -> TelemetrySnapshot:
+        """Snapshot of the slots, taken while holding `lock`."""
+        snapshot = self._published
+        if snapshot.version != self.generation or len(snapshot.values) != len(self.values):
+            snapshot = TelemetrySnapshot(
+                self.generation, tuple(self.values), memoryview(self.generations.tobytes()).cast("Q"))
+            self._published = snapshot
+        return snapshot
+
     def current_milli_time() -> float:
         return round(time.time() * 1000)
 
     def updated(self):
         self.last_update = self.current_milli_time()
 
+class DeviceMetrics:
+    def __init__(self) -> None:
+        self.messages = 0
+        # applying a decoded message to the data, decoding is timed by the client's ParseStats
+        self.apply_us = Histogram(LATENCY_BUCKETS_US)
+        self.fanout_us = Histogram(LATENCY_BUCKETS_US)
+        # per entity class name
+        self.state_writes = dict[str, int]()
+
+    def count_write(self, entity_class: str):
+        self.state_writes[entity_class] = self.state_writes.get(entity_class, 0) + 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "apply_us": self.apply_us.as_dict(),
+            "fanout_us": self.fanout_us.as_dict(),
+            "state_writes": self.state_writes,
+        }
+
 class BaseDevice:
+    # quota keys read by the device, periodic refreshes fetch only these
+    quota_keys: list[str] = []
+
     def __init__(self, sn: str, name: str, status: int, api_client) -> None:
         self.sn = sn
         self.name = name
@@ -96,7 +204,22 @@ class BaseDevice:
         from ..api.ecoflow_client import EcoFlowApiClient
         self.api_client: EcoFlowApiClient = api_client
         self.data = DataHolder()
+        self.metrics = DeviceMetrics()
         self.coordinator = None
+        self.commands: CommandScheduler = None
+        # WarmStartCache of the config entry, keeps the last quota snapshot
+        self.cache = None
+        # DeviceModel the device was created from
+        self.model = None
+        # rolling statistics by data slot, for the channels a device tracks
+        self.rolling = dict[int, RollingChannel]()
+        self.rolling_groups = list[RollingGroup]()
+        # DeviceInbox feeding the device from mqtt, set on subscribe
+        self.inbox = None
+
+    @property
+    def ready(self) -> bool:
+        return self.data.allocated
 
     def _sensors(self) -> list[SensorEntity]:
         return []
@@ -110,17 +233,105 @@ class BaseDevice:
     async def connect_mqtt(self, hass):
         pass
 
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "generation": self.data.generation,
+            "state_writes": self.data.state_writes,
+            "suppressed_writes": self.data.suppressed_writes,
+            "throttled_writes": self.data.throttled_writes,
+            "commands": self.commands.diagnostics() if self.commands else None,
+            "metrics": self.metrics.as_dict(),
+            "inbox": self.inbox.diagnostics() if self.inbox else None,
+        }
+
     def _active_unique_ids(self) -> list[str]:
         return list(
             map(lambda sensor: sensor.unique_id, self._sensors())
         )
 
-    def configure(self, hass):
-        self.coordinator = EntityUpdateCoordinator(hass, self)
+    def configure(self, hass, stale_interval: int = DEFAULT_STALE_INTERVAL):
+        self.coordinator = EntityUpdateCoordinator(hass, self, stale_interval)
+        self.commands = CommandScheduler(hass, self.sn, self._send_command)
+
+    def close(self):
+        if self.commands is not None:
+            self.commands.cancel()
+
+    async def _send_command(self, command: BaseEntityCommand) -> bool:
+        return await self.api_client.send_command(self.sn, command, CommandTarget.MQTT)
 
     def calculate_data(self):
         pass
 
+    def _apply_message(self, message: EcoflowMqttMessage):
+        pass
+
+    def _receive(self, message: EcoflowMqttMessage) -> bool:
+        """Apply a quota message to the data, runs on the mqtt thread.
+
+        The snapshot is taken on the loop by `_publish_snapshot`, once for all
+        messages applied since the last inbox drain.
+        """
+        data = self.data
+        if not data.allocated:
+            return False
+
+        started = time.perf_counter_ns()
+        with data.lock:
+            self._apply_message(message)
+        metrics = self.metrics
+        metrics.messages += 1
+        metrics.apply_us.observe((time.perf_counter_ns() - started) / 1000)
+        return True
+
+    @callback
+    def _publish_snapshot(self):
+        """Swap in a snapshot of the data and notify entities, once per inbox drain.
+
+        Rolling windows with a new reading are sampled from the snapshot here on
+        the loop, where their sensors read them.
+        """
+        data = self.data
+        with data.lock:
+            snapshot = data.snapshot = data.publish()
+            readings = [group.take() for group in self.rolling_groups]
+        for group, timestamp in zip(self.rolling_groups, readings):
+            if timestamp is not None:
+                group.add(timestamp, snapshot.values)
+        started = time.perf_counter_ns()
+        self.coordinator.async_push_update()
+        self.metrics.fanout_us.observe((time.perf_counter_ns() - started) / 1000)
+
+    def _calculate_and_publish(self):
+        data = self.data
+        with data.lock:
+            self.calculate_data()
+            data.snapshot = data.publish()
+
     async def update_data(self):
-        self.data.response_data = await self.api_client.get_device_info(self.sn)
-        self.calculate_data()
+        if self.ready and self.quota_keys:
+            # structure is known, refresh only the keys the device reads
+            response_data = await self.api_client.get_device_quota(self.sn, self.quota_keys)
+            if response_data is not None:
+                response_data = {**self.data.response_data, **response_data}
+        else:
+            response_data = await self.api_client.get_device_info(self.sn)
+        if response_data is None:
+            # keep the last known data instead of dropping it on a failed refresh
+            return
+        self.data.response_data = response_data
+        self._calculate_and_publish()
+        if self.cache is not None:
+            self.cache.set_quota(self.sn, response_data)
+
+    def load_snapshot(self, response_data) -> bool:
+        """Build data from a cached quota snapshot."""
+        try:
+            self.data.response_data = response_data
+            self._calculate_and_publish()
+        except Exception as error:
+            _LOGGER.warning(f"Cached data of {self.sn} can't be used: {error}")
+            return False
+        return self.ready
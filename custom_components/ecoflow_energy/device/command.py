@@ -1,11 +1,19 @@
 from dataclasses import dataclass, field
+import itertools
 import json
 
 from enum import IntEnum, StrEnum
 from random import randint
 from typing import Any, Dict
 
-from dacite import from_dict, Config
+# monotonic so concurrent commands never share an id, random start to not
+# collide with replies to commands sent before a restart
+_command_ids = itertools.count(randint(10000, 1000000))
+
+
+def next_command_id() -> int:
+    return next(_command_ids)
+
 
 class CommandTarget(StrEnum):
     HTTP = "HTTP"
@@ -25,14 +33,13 @@ class BaseCommandV1:
     operateType: str
     version: str
     def __init__(self) -> None:
-        self.id = randint(10000, 1000000)
+        self.id = next_command_id()
         self.operateType = "TCP"
         self.version = "1.0"
 
 class BaseEntityCommand(BaseCommandV1):
     def __init__(self, sn: str, cmd_set: CommandSet, cmd_id: CommandId, data: dict[str, Any]) -> None:
         super().__init__()
-        self.id = randint(10000, 1000000)
         self.moduleType = 1
         self.sn = sn
         self.params = {
@@ -41,6 +48,10 @@ class BaseEntityCommand(BaseCommandV1):
         }
         self.params.update(data)
 
+    def coalesce_key(self) -> tuple:
+        """Commands with the same key target the same state and may replace each other."""
+        return (self.params["cmdSet"], self.params["id"], self.params.get("ch"))
+
     def to_message(self) -> str:
         return json.dumps(self.__dict__)
 
@@ -59,4 +70,6 @@ class BaseEntityCommandResponse(BaseCommandV1):
 
     @staticmethod
     def from_dict(dict):
+        # dacite is only needed once a command is answered
+        from dacite import from_dict
         return from_dict(data_class=BaseEntityCommandResponse, data=dict)
\ No newline at end of file
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable
+
+from . import BaseDevice
+from .registry import MISSING, EntityKind, Extractor
+from ..api.message import EcoflowMqttMessage
+
+if TYPE_CHECKING:
+    from homeassistant.components.select import SelectEntity
+    from homeassistant.components.switch import SwitchEntity
+
+    from ..sensor import BaseSensor
+
+
+class DeclarativeDevice(BaseDevice):
+    """Device built from the field declarations of its DeviceModel.
+
+    Every field is one slot with a compiled extractor, so HTTP snapshots and MQTT
+    params are applied by the same loop.
+    """
+
+    def __init__(self, sn: str, name: str, status: int, api_client) -> None:
+        super().__init__(sn, name, status, api_client)
+        self.fields = list[tuple[int, Extractor, Callable[[Any], Any] | None]]()
+
+    def calculate_data(self):
+        if not self.data.allocated:
+            self._allocate()
+        self._apply(self.data.response_data)
+
+    async def connect_mqtt(self, hass):
+        await super().connect_mqtt(hass)
+        self.inbox = self.api_client.mqtt_client.subscribe_to_device(self.sn, self._receive, self._publish_snapshot)
+
+    def _apply_message(self, message: EcoflowMqttMessage):
+        self._apply(message.params)
+
+    def _allocate(self):
+        for spec in self.model.fields:
+            group = "switches" if spec.kind == EntityKind.SWITCH else "sensors"
+            slot = self.data.allocate(group, spec.key, spec.name)
+            self.fields.append((slot, spec.extract, spec.convert))
+
+    def _apply(self, source: dict[str, Any]):
+        data = self.data
+        for slot, extract, convert in self.fields:
+            value = extract(source)
+            if value is MISSING:
+                continue
+            data.set(slot, value if convert is None else convert(value))
+
+    def _sensors(self) -> list[BaseSensor]:
+        # entity classes load with their platform
+        from ..sensor import SENSOR_CLASSES
+
+        return [
+            SENSOR_CLASSES[spec.kind](self, spec.key)
+            for spec in self.model.fields
+            if spec.kind != EntityKind.SWITCH and self.data.has_value("sensors", spec.key)
+        ]
+
+    def switches(self) -> list[SwitchEntity]:
+        from ..switch import EnableSwitch
+
+        return [
+            EnableSwitch(self, spec.key, spec.command.cmd_set, spec.command.cmd_id, spec.command.on, spec.command.off)
+            for spec in self.model.fields
+            if spec.kind == EntityKind.SWITCH and spec.command is not None
+        ]
+
+    def selects(self) -> list[SelectEntity]:
+        return []
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from array import array
+
+# longer gaps (device offline, lost messages) are not integrated
+MAX_INTEGRATION_GAP = 300
+# how often the totals are handed to the warm start cache, in seconds of message time
+ENERGY_CHECKPOINT_INTERVAL = 300
+
+# W * s -> kWh, halved for the trapezoid
+_TRAPEZOID_KWH = 1 / (2 * 3600 * 1000)
+
+
+class EnergyAccumulator:
+    """Integrates the power of several channels into energy with the trapezoidal rule.
+
+    Parsers write the latest power (W) of every channel into `power`, then `integrate`
+    adds the energy since the previous reading to `totals` (kWh) for all channels in
+    one pass, using the message timestamp.
+    """
+    __slots__ = ("power", "previous", "totals", "timestamp", "max_gap")
+
+    def __init__(self, channels: int, max_gap: float = MAX_INTEGRATION_GAP) -> None:
+        self.power = array("d", bytes(8 * channels))
+        self.previous = array("d", bytes(8 * channels))
+        self.totals = array("d", bytes(8 * channels))
+        self.timestamp: float | None = None
+        self.max_gap = max_gap
+
+    def integrate(self, timestamp: float) -> bool:
+        """Add the energy since the previous reading, `timestamp` in seconds."""
+        power = self.power
+        previous = self.previous
+        integrated = False
+        if self.timestamp is not None:
+            elapsed = timestamp - self.timestamp
+            if elapsed <= 0:
+                # out of order, keep the newer timestamp
+                previous[:] = power
+                return False
+            if elapsed <= self.max_gap:
+                totals = self.totals
+                factor = elapsed * _TRAPEZOID_KWH
+                for index in range(len(totals)):
+                    totals[index] += (previous[index] + power[index]) * factor
+                integrated = True
+        self.timestamp = timestamp
+        previous[:] = power
+        return integrated
+
+    def restart(self):
+        """Start over from the next reading, used for readings without a timestamp."""
+        self.timestamp = None
+        self.previous[:] = self.power
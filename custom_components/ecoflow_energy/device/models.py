@@ -0,0 +1,15 @@
+from .declarative import DeclarativeDevice
+from .registry import DeviceModel, DeviceRegistry, EntityKind, FieldSpec
+from .smart_home_panel import SmartHomePanel
+
+DEVICE_MODELS = DeviceRegistry()
+
+# channels are parsed by the device class, quota paths are its quota_keys
+DEVICE_MODELS.register(DeviceModel("Smart Home Panel", SmartHomePanel))
+
+DEVICE_MODELS.register(DeviceModel("DELTA Pro", DeclarativeDevice, fields=(
+    FieldSpec("soc", "Battery Level", "pd.soc", EntityKind.BATTERY),
+    FieldSpec("watts_in", "Input", "pd.wattsInSum", EntityKind.POWER),
+    FieldSpec("watts_out", "Output", "pd.wattsOutSum", EntityKind.POWER),
+    FieldSpec("bat_temp", "Battery Temperature", "bmsMaster.temp", EntityKind.TEMPERATURE),
+)))
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Any, Callable
+
+# returned by extractors when the value is not in the source
+MISSING = object()
+
+Extractor = Callable[[dict[str, Any]], Any]
+
+
+class EntityKind(StrEnum):
+    POWER = "power"
+    ENERGY = "energy"
+    BATTERY = "battery"
+    TEMPERATURE = "temperature"
+    DURATION = "duration"
+    CURRENT = "current"
+    INFO = "info"
+    SWITCH = "switch"
+
+
+def _flat_lookup(key: str) -> Extractor:
+    def extract(source: dict[str, Any]) -> Any:
+        return source.get(key, MISSING)
+    return extract
+
+
+def _nested_lookup(head: str, rest: tuple[str, ...]) -> Extractor:
+    if len(rest) == 1:
+        # the common case, unrolled
+        key = rest[0]
+
+        def extract_child(source: dict[str, Any]) -> Any:
+            node = source.get(head)
+            if type(node) is dict:
+                return node.get(key, MISSING)
+            return MISSING
+        return extract_child
+
+    def extract(source: dict[str, Any]) -> Any:
+        node = source.get(head, MISSING)
+        for part in rest:
+            if type(node) is not dict:
+                return MISSING
+            node = node.get(part, MISSING)
+        return node
+    return extract
+
+
+def compile_path(*paths: str) -> Extractor:
+    """Extractor of a quota value, for flattened and nested sources.
+
+    HTTP quotas use flattened keys (`heartbeat.energyInfos`), MQTT params the nested
+    structure (`{"heartbeat": {"energyInfos": ...}}`). Every split of a path into a
+    flattened head and nested rest is tried, longest head first; further paths are
+    aliases, for values MQTT sends under another name.
+    """
+    lookups = list[Extractor]()
+    for path in paths:
+        parts = path.split(".")
+        for head in path_heads(path):
+            rest = tuple(parts[head.count(".") + 1:])
+            lookups.append(_nested_lookup(head, rest) if rest else _flat_lookup(head))
+
+    if len(lookups) == 1:
+        return lookups[0]
+    if len(lookups) == 2:
+        first, second = lookups
+
+        def extract_either(source: dict[str, Any]) -> Any:
+            value = first(source)
+            return second(source) if value is MISSING else value
+        return extract_either
+
+    def extract(source: dict[str, Any]) -> Any:
+        for lookup in lookups:
+            value = lookup(source)
+            if value is not MISSING:
+                return value
+        return MISSING
+    return extract
+
+
+def path_heads(path: str) -> list[str]:
+    """Top level keys a path can appear under: flattened (`a.b`) or nested (`a`)."""
+    parts = path.split(".")
+    return [".".join(parts[:split]) for split in range(len(parts), 0, -1)]
+
+
+def compile_dispatch(sections: tuple[tuple[str, str | None, str], ...]) -> dict[str, list[tuple[Extractor, str]]]:
+    """Dispatch table of (path, mqtt alias, handler name) sections by top level source key.
+
+    Applying a source walks its keys once and runs every section found under them,
+    whether the source is a flattened HTTP quota or nested MQTT params.
+    """
+    table = dict[str, list[tuple[Extractor, str]]]()
+    for path, alias, handler in sections:
+        paths = (path,) if alias is None else (path, alias)
+        extract = compile_path(*paths)
+        for head in dict.fromkeys(head for each in paths for head in path_heads(each)):
+            table.setdefault(head, []).append((extract, handler))
+    return table
+
+
+@dataclass(frozen=True)
+class CommandSpec:
+    cmd_set: int
+    cmd_id: int
+    on: dict[str, Any]
+    off: dict[str, Any]
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """One value of a product: where it is in the quota and how it is exposed."""
+    key: str
+    name: str
+    path: str
+    kind: EntityKind = EntityKind.INFO
+    mqtt_path: str | None = None
+    convert: Callable[[Any], Any] | None = None
+    command: CommandSpec | None = None
+    extract: Extractor = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        paths = (self.path,) if self.mqtt_path is None else (self.path, self.mqtt_path)
+        object.__setattr__(self, "extract", compile_path(*paths))
+
+
+@dataclass(frozen=True)
+class DeviceModel:
+    """A supported product, `fields` are applied by devices built from declarations."""
+    product_name: str
+    device_class: type
+    fields: tuple[FieldSpec, ...] = ()
+
+    @property
+    def quota_keys(self) -> list[str]:
+        return list(dict.fromkeys([*self.device_class.quota_keys, *(spec.path for spec in self.fields)]))
+
+    def create(self, sn: str, status: int, api_client):
+        device = self.device_class(sn=sn, name=self.product_name, status=status, api_client=api_client)
+        device.model = self
+        device.quota_keys = self.quota_keys
+        return device
+
+
+class DeviceRegistry:
+    def __init__(self) -> None:
+        self._models = dict[str, DeviceModel]()
+
+    def register(self, model: DeviceModel) -> DeviceModel:
+        self._models[model.product_name] = model
+        return model
+
+    def get(self, product_name: str) -> DeviceModel | None:
+        return self._models.get(product_name)
+
+    def __contains__(self, product_name: str) -> bool:
+        return product_name in self._models
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import math
+import time
+
+from array import array
+from typing import Any
+
+# rolling windows in seconds, every window is a ring of WINDOW_BUCKETS time buckets
+DEFAULT_WINDOWS = (60, 900, 3600)
+WINDOW_BUCKETS = 60
+
+# marks a channel without a reading in a sample
+_MISSING = math.nan
+
+
+def window_label(span: int) -> str:
+    if span % 3600 == 0:
+        return f"{span // 3600}h"
+    if span % 60 == 0:
+        return f"{span // 60}m"
+    return f"{span}s"
+
+
+def stat_names(span: int, buckets: int = WINDOW_BUCKETS) -> tuple[str, ...]:
+    """Statistics of a window; the percentile is over bucket means, and named so."""
+    return ("min", "max", "mean", f"p95 of {window_label(max(1, round(span / buckets)))} means")
+
+
+def attribute_names(spans: tuple[int, ...] = DEFAULT_WINDOWS) -> frozenset[str]:
+    return frozenset(f"{window_label(span)} {name}" for span in spans for name in stat_names(span))
+
+
+class RollingWindow:
+    """Min/max/mean and p95 of bucket means of a group of channels over the last `span` seconds.
+
+    Samples are folded into a ring of fixed time buckets, so an update is O(1) per
+    channel and memory doesn't depend on the message rate. Channels sampled
+    together share the bucket lookup; per channel values are stored bucket-major.
+    A channel without a reading (NaN) is not counted in the bucket.
+    """
+    __slots__ = ("span", "bucket_span", "channels", "names", "epochs", "counts", "sums", "mins", "maxs")
+
+    def __init__(self, span: int, channels: int, buckets: int = WINDOW_BUCKETS) -> None:
+        self.span = span
+        self.bucket_span = span / buckets
+        self.channels = channels
+        self.names = stat_names(span, buckets)
+        # absolute bucket number held by each position, -1 when empty
+        self.epochs = array("q", [-1]) * buckets
+        self.counts = array("I", [0]) * (buckets * channels)
+        self.sums = array("d", [0.0]) * (buckets * channels)
+        self.mins = array("d", [0.0]) * (buckets * channels)
+        self.maxs = array("d", [0.0]) * (buckets * channels)
+
+    def add(self, timestamp: float, values: array, present: array):
+        epoch = int(timestamp // self.bucket_span)
+        position = epoch % len(self.epochs)
+        current = self.epochs[position]
+        start = position * self.channels
+        if current < epoch:
+            # new bucket, copied in C
+            end = start + self.channels
+            self.epochs[position] = epoch
+            self.counts[start:end] = present
+            self.sums[start:end] = values
+            self.mins[start:end] = values
+            self.maxs[start:end] = values
+        elif current == epoch:
+            counts = self.counts
+            sums = self.sums
+            mins = self.mins
+            maxs = self.maxs
+            for index, value in enumerate(values, start):
+                if value != value:
+                    # missing reading
+                    continue
+                if not counts[index]:
+                    counts[index] = 1
+                    sums[index] = mins[index] = maxs[index] = value
+                    continue
+                counts[index] += 1
+                sums[index] += value
+                if value < mins[index]:
+                    mins[index] = value
+                elif value > maxs[index]:
+                    maxs[index] = value
+        # samples older than the bucket at their position are dropped
+
+    def stats(self, channel: int, now: float) -> dict[str, float] | None:
+        oldest = int(now // self.bucket_span) - len(self.epochs)
+        count = 0
+        total = 0.0
+        low = high = None
+        means = []
+        for position, epoch in enumerate(self.epochs):
+            if epoch <= oldest:
+                continue
+            index = position * self.channels + channel
+            bucket_count = self.counts[index]
+            if not bucket_count:
+                continue
+            count += bucket_count
+            total += self.sums[index]
+            means.append(self.sums[index] / bucket_count)
+            if low is None or self.mins[index] < low:
+                low = self.mins[index]
+            if high is None or self.maxs[index] > high:
+                high = self.maxs[index]
+        if not count:
+            return None
+        means.sort()
+        p95 = means[min(len(means) - 1, int(len(means) * 0.95))]
+        return dict(zip(self.names, (round(low, 2), round(high, 2), round(total / count, 2), round(p95, 2))))
+
+
+class RollingGroup:
+    """Rolling windows of data slots that are sampled together.
+
+    Parsers note a reading with `read` under the device data lock, the windows are
+    sampled from the next snapshot on the loop, which also reads them, so they are
+    only ever touched by one thread.
+    """
+
+    def __init__(self, slots: list[int], spans: tuple[int, ...] = DEFAULT_WINDOWS) -> None:
+        self.slots = slots
+        self.values = array("d", [0.0]) * len(slots)
+        self.present = array("I", [0]) * len(slots)
+        self.windows = [RollingWindow(span, len(slots)) for span in spans]
+        # timestamp of the latest reading not sampled yet
+        self.pending: float | None = None
+
+    def read(self, timestamp: float):
+        self.pending = timestamp
+
+    def take(self) -> float | None:
+        timestamp = self.pending
+        self.pending = None
+        return timestamp
+
+    def add(self, timestamp: float, values: list[Any]):
+        """Sample the group's slots from the device data values, slots without a value are skipped."""
+        sample = self.values
+        present = self.present
+        for index, slot in enumerate(self.slots):
+            value = values[slot]
+            if value is None:
+                sample[index] = _MISSING
+                present[index] = 0
+            else:
+                sample[index] = value
+                present[index] = 1
+        for window in self.windows:
+            window.add(timestamp, sample, present)
+
+    def channel(self, slot: int) -> RollingChannel:
+        return RollingChannel(self, self.slots.index(slot))
+
+
+class RollingChannel:
+    """Statistics of one slot of a group, used by its sensor."""
+    __slots__ = ("group", "index")
+
+    def __init__(self, group: RollingGroup, index: int) -> None:
+        self.group = group
+        self.index = index
+
+    def attributes(self, now: float | None = None) -> dict[str, Any]:
+        """Statistics of the windows ending at `now` (wall clock), windows without samples are left out."""
+        if now is None:
+            now = time.time()
+        attributes = {}
+        for window in self.group.windows:
+            stats = window.stats(self.index, now)
+            if stats is None:
+                continue
+            label = window_label(window.span)
+            for name, value in stats.items():
+                attributes[f"{label} {name}"] = value
+        return attributes
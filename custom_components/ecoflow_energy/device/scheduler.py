@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from asyncio import Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from homeassistant.core import HomeAssistant
+
+from .command import BaseEntityCommand
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_PARALLEL_COMMANDS = 4
+
+
+@dataclass
+class QueuedCommand:
+    command: BaseEntityCommand
+    future: Future[bool]
+
+
+class CommandScheduler:
+    """Per device command queue.
+
+    Commands for the same channel and command id are serialized and, while one is
+    waiting for its reply, newer ones replace the queued one so only the latest
+    desired state is sent. Superseded callers get `False`. Commands for different
+    channels run in parallel, up to `max_parallel` at a time.
+    """
+
+    def __init__(self, hass: HomeAssistant, sn: str,
+                 send: Callable[[BaseEntityCommand], Awaitable[bool]],
+                 max_parallel: int = MAX_PARALLEL_COMMANDS) -> None:
+        self.hass = hass
+        self.sn = sn
+        self._send = send
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._queued = dict[tuple, QueuedCommand]()
+        self._active = set[tuple]()
+        self.submitted = 0
+        self.coalesced = 0
+
+    async def async_submit(self, command: BaseEntityCommand) -> bool:
+        key = command.coalesce_key()
+        future = self.hass.loop.create_future()
+        self.submitted += 1
+
+        superseded = self._queued.get(key)
+        if superseded is not None:
+            self.coalesced += 1
+            if not superseded.future.done():
+                superseded.future.set_result(False)
+        self._queued[key] = QueuedCommand(command, future)
+
+        if key not in self._active:
+            self._active.add(key)
+            self.hass.async_create_background_task(self._run(key), f"ecoflow command {self.sn} {key}")
+        return await future
+
+    async def _run(self, key: tuple):
+        try:
+            while (queued := self._queued.pop(key, None)) is not None:
+                if queued.future.done():
+                    continue
+                async with self._semaphore:
+                    try:
+                        result = await self._send(queued.command)
+                    except Exception as error:
+                        if not queued.future.done():
+                            queued.future.set_exception(error)
+                    else:
+                        if not queued.future.done():
+                            queued.future.set_result(result)
+        finally:
+            self._active.discard(key)
+
+    def cancel(self):
+        """Drop queued commands on unload, their callers get `False`."""
+        for queued in self._queued.values():
+            if not queued.future.done():
+                queued.future.set_result(False)
+        self._queued.clear()
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "queued": len(self._queued),
+            "active": len(self._active),
+        }
@@ -1,17 +1,22 @@
-import json
+from __future__ import annotations
+
 import logging
+import time
 
 from enum import IntEnum
+from typing import TYPE_CHECKING, NamedTuple
 
-from homeassistant.components.select import SelectEntity
-from homeassistant.components.switch import SwitchEntity
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from . import BaseDevice, EntitySensorKey
+from .energy import ENERGY_CHECKPOINT_INTERVAL, EnergyAccumulator
+from .registry import MISSING, EntityKind, compile_dispatch
+from .rolling import DEFAULT_WINDOWS, RollingGroup
+from ..api.message import EcoflowMqttMessage
 
-from . import BaseDevice, DataValue, EntitySensorKey
+if TYPE_CHECKING:
+    from homeassistant.components.select import SelectEntity
+    from homeassistant.components.switch import SwitchEntity
 
-from ..sensor import InfoSensor, RemainSensorEntity, LevelSensorEntity, AmpSensorEntity, WattsSensorEntity, TempSensorEntity, BaseSensor
-from ..switch import EnableSwitch
-from ..select import BreakerModeSelect
+    from ..sensor import BaseSensor
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,18 +39,28 @@ power_output_type = {
 }
 
 http_breaker_ctrls_key = "heartbeat.loadCmdChCtrlInfos"
-mqtt_breaker_ctrls_key = "loadCmdChCtrlInfos"
 
 http_breaker_value_key = "channelPower.infoList"
 mqtt_breaker_value_key = "infoList"
 
 http_battery_info_key = "heartbeat.energyInfos"
-mqtt_battery_info_key = "energyInfos"
 
-breaker_suffixes = ["_priority", "_mode", "_cur_limit", "_source"]
+# quota sections applied from both HTTP snapshots and MQTT params: path, MQTT alias, parser
+quota_sections = (
+    (http_breaker_ctrls_key, None, "_parse_breakers_control_info"),
+    (http_breaker_value_key, mqtt_breaker_value_key, "_parse_breakers_power_info"),
+    (http_battery_info_key, None, "_parse_battery_info"),
+    ("loadChCurInfo.cur", None, "_parse_current_limits"),
+    ("epsModeInfo.eps", None, "_parse_eps_info"),
+)
+quota_dispatch = compile_dispatch(quota_sections)
+
+breaker_suffixes = ["_priority", "_mode", "_cur_limit", "_source", "_energy"]
 battery_suffixes = [
     "_input",
     "_output",
+    "_input_energy",
+    "_output_energy",
     "_connected",
     "_enabled",
     "_grid_charging",
@@ -60,20 +75,23 @@ battery_suffixes = [
     ""
 ]
 
-battery_suffixes_and_classes = [
-    ("_input", WattsSensorEntity),
-    ("_output", WattsSensorEntity),
-    ("_connected", InfoSensor),
-    ("_enabled", InfoSensor),
-    ("_grid_charging", InfoSensor),
-    ("_mppt_charging", InfoSensor),
-    ("_ac_open", InfoSensor),
-    ("_discharge_time", RemainSensorEntity),
-    ("_charge_time", RemainSensorEntity),
-    ("_power_rate", WattsSensorEntity),
-    ("_cur_limit", AmpSensorEntity),
-    ("_bat_temp", TempSensorEntity),
-    ("", LevelSensorEntity)
+# sensor kind of every battery field, classes are looked up in SENSOR_CLASSES when the platform is set up
+battery_suffixes_and_kinds = [
+    ("_input", EntityKind.POWER),
+    ("_output", EntityKind.POWER),
+    ("_input_energy", EntityKind.ENERGY),
+    ("_output_energy", EntityKind.ENERGY),
+    ("_connected", EntityKind.INFO),
+    ("_enabled", EntityKind.INFO),
+    ("_grid_charging", EntityKind.INFO),
+    ("_mppt_charging", EntityKind.INFO),
+    ("_ac_open", EntityKind.INFO),
+    ("_discharge_time", EntityKind.DURATION),
+    ("_charge_time", EntityKind.DURATION),
+    ("_power_rate", EntityKind.POWER),
+    ("_cur_limit", EntityKind.CURRENT),
+    ("_bat_temp", EntityKind.TEMPERATURE),
+    ("", EntityKind.BATTERY)
 ]
 
 class PowerType(IntEnum):
@@ -84,160 +102,292 @@ class PowerType(IntEnum):
     def is_grid(self):
         return self == PowerType.GRID
 
+class BreakerSlots(NamedTuple):
+    power: int
+    priority: int
+    mode: int
+    source_type: int
+    source: int
+    cur_limit: int
+
+
+class BatterySlots(NamedTuple):
+    input: int
+    output: int
+    connected: int
+    enabled: int
+    grid_charging: int
+    mppt_charging: int
+    ac_open: int
+    discharge_time: int
+    charge_time: int
+    level: int
+    power_rate: int
+    cur_limit: int
+    bat_temp: int
+    charge_switch: int
+
+
 class SmartHomePanel(BaseDevice):
+    rolling_windows = DEFAULT_WINDOWS
+    quota_keys = [
+        http_breaker_ctrls_key,
+        http_breaker_value_key,
+        "loadChInfo",
+        "chUseInfo.isEnable",
+        http_battery_info_key,
+        "loadChCurInfo.cur",
+        "epsModeInfo.eps",
+    ]
+
+    def __init__(self, sn: str, name: str, status: int, api_client) -> None:
+        super().__init__(sn, name, status, api_client)
+        self.batteries_count = 0
+        self.breaker_slots = list[BreakerSlots]()
+        self.battery_slots = list[BatterySlots]()
+        self.grid_slot = None
+        self.grid_max_output_slot = None
+        self.eps_slot = None
+        # energy channels: breakers, grid, then input and output of every battery
+        self.energy: EnergyAccumulator | None = None
+        self.energy_keys = list[str]()
+        self.energy_slots = list[int]()
+        self._energy_checkpoint = 0.0
+        # power and temperature channels with rolling statistics
+        self.power_rolling: RollingGroup | None = None
+        self.temp_rolling: RollingGroup | None = None
+        # quota_dispatch with parsers bound to this device
+        self._dispatch = {
+            head: [(extract, getattr(self, parser)) for extract, parser in handlers]
+            for head, handlers in quota_dispatch.items()
+        }
+
     def calculate_data(self):
         self._build_structure()
 
+    def close(self):
+        self._checkpoint_energy()
+        super().close()
+
     async def connect_mqtt(self, hass):
         await super().connect_mqtt(hass)
-        async_dispatcher_connect(hass, f"device_update_{self.sn}", self._handle_mqtt_message)
-        self.api_client.mqtt_client.subscribe_to_device(self.sn, "quota")
-
-    async def _handle_mqtt_message(self, message):
-        """Handle incoming MQTT message specifically for power calculation."""
-        if self.data.mapped_data["sensors"] is None:
-            return
-
-        try:
-            topic_command_key = message.topic.split("/")[-1]
-
-            value_str = message.payload.decode("utf-8", errors='ignore')
-            value = json.loads(value_str)
-            if topic_command_key != "set_reply":
-                if "params" in value:
-                    params = value["params"]
-                    if mqtt_breaker_value_key in params:
-                        self._parse_breakers_power_info(params[mqtt_breaker_value_key])
-                    elif "heartbeat" in params:
-                        heartbeat = params["heartbeat"]
-                        if mqtt_breaker_ctrls_key in heartbeat:
-                            self._parse_breakers_control_info(heartbeat[mqtt_breaker_ctrls_key])
-                        if mqtt_battery_info_key in heartbeat:
-                            self._parse_battery_info(heartbeat[mqtt_battery_info_key])
-                    elif "cmdSet" in params and "id" in params: # handle mqtt set command response
-                        pass
-        except UnicodeDecodeError as error:
-            _LOGGER.warning(f"UnicodeDecodeError: {error}. Trying to load json.")
-        except Exception as error:
-            _LOGGER.warning(f"Exception: {error}. Trying to load json.")
-
-    def _parse_breakers_control_info(self, params):
-        for index, breaker in enumerate(params):
-            consume_type = PowerType(breaker["ctrlSta"])
-            base_key = f"{EntitySensorKey.BREAKER}{index}"
-
-            self.data.mapped_data["sensors"][f"{base_key}_priority"] = DataValue(f"Breaker {index + 1} priority",
-                                                                             breaker["priority"])
+        self.inbox = self.api_client.mqtt_client.subscribe_to_device(self.sn, self._receive, self._publish_snapshot)
 
-            self.data.mapped_data["sensors"][f"{base_key}_mode"] = DataValue(f"Breaker {index + 1} mode",
-                                                                             breaker["ctrlMode"])
-            self.data.mapped_data["sensors"][f"{base_key}_source_type"] = DataValue(f"Breaker {index + 1} mode",
-                                                                             consume_type)
+    def _apply_message(self, message: EcoflowMqttMessage):
+        timestamp = message.payload.get("timestamp")
+        self._apply(message.params, timestamp / 1000 if timestamp else time.time())
 
-            self.data.mapped_data["sensors"][f"{base_key}_source"] = DataValue(f"Breaker {index + 1} source",
-                                                                             power_output_type[consume_type])
+    def _allocate(self, batteries_count):
+        """Allocate a slot for every field, names and keys are built only here."""
+        data = self.data
+        self.batteries_count = batteries_count
 
-    def _parse_breakers_power_info(self, params):
+        for index in range(breakers_count):
+            base_key = f"{EntitySensorKey.BREAKER}{index}"
+            name = f"Breaker {index + 1}"
+            self.breaker_slots.append(BreakerSlots(
+                power=data.allocate("sensors", base_key, name),
+                priority=data.allocate("sensors", f"{base_key}_priority", f"{name} priority"),
+                mode=data.allocate("sensors", f"{base_key}_mode", f"{name} mode"),
+                source_type=data.allocate("sensors", f"{base_key}_source_type", f"{name} mode"),
+                source=data.allocate("sensors", f"{base_key}_source", f"{name} source"),
+                cur_limit=data.allocate("sensors", f"{base_key}_cur_limit", f"{name} current limit"),
+            ))
+
+        for index in range(batteries_count):
+            base_key = f"{EntitySensorKey.BATTERY}{index + 1}"
+            name = f"Battery {index + 1}"
+            self.battery_slots.append(BatterySlots(
+                input=data.allocate("sensors", f"{base_key}_input", f"{name} Input"),
+                output=data.allocate("sensors", f"{base_key}_output", f"{name} Output"),
+                connected=data.allocate("sensors", f"{base_key}_connected", f"{name} Connected"),
+                enabled=data.allocate("sensors", f"{base_key}_enabled", f"{name} Enabled"),
+                grid_charging=data.allocate("sensors", f"{base_key}_grid_charging", f"{name} Grid Charging"),
+                mppt_charging=data.allocate("sensors", f"{base_key}_mppt_charging", f"{name} MPPT Charging"),
+                ac_open=data.allocate("sensors", f"{base_key}_ac_open", f"{name} AC Open"),
+                discharge_time=data.allocate("sensors", f"{base_key}_discharge_time", f"{name} Discharge Time"),
+                charge_time=data.allocate("sensors", f"{base_key}_charge_time", f"{name} Charge Time"),
+                level=data.allocate("sensors", base_key, name),
+                power_rate=data.allocate("sensors", f"{base_key}_power_rate", f"{name} Power Rate"),
+                cur_limit=data.allocate("sensors", f"{base_key}_cur_limit", f"{name} current limit"),
+                bat_temp=data.allocate("sensors", f"{base_key}_bat_temp", f"{name} Battery Temperature"),
+                charge_switch=data.allocate("switches", f"{base_key}_charge_switch", f"{name} Charging"),
+            ))
+
+        self.grid_slot = data.allocate("sensors", EntitySensorKey.SHP_GRID, "Grid Usage")
+        self.grid_max_output_slot = data.allocate("sensors", f"{EntitySensorKey.SHP_GRID}_max_output", "Grid Max Output Power")
+        self.eps_slot = data.allocate("switches", "eps", "EPS Mode")
+        self._allocate_energy()
+
+        power_slots = [slots.power for slots in self.breaker_slots] + [self.grid_slot]
+        for slots in self.battery_slots:
+            power_slots.extend((slots.input, slots.output))
+        self.power_rolling = self._track_rolling(power_slots)
+        self.temp_rolling = self._track_rolling([slots.bat_temp for slots in self.battery_slots])
+
+    def _track_rolling(self, slots: list[int]) -> RollingGroup:
+        group = RollingGroup(slots, self.rolling_windows)
+        self.rolling_groups.append(group)
+        for slot in slots:
+            self.rolling[slot] = group.channel(slot)
+        return group
+
+    def _allocate_energy(self):
+        channels = [(f"{EntitySensorKey.BREAKER}{index}_energy", f"Breaker {index + 1} Energy")
+                    for index in range(breakers_count)]
+        channels.append((f"{EntitySensorKey.SHP_GRID}_energy", "Grid Energy"))
+        for index in range(self.batteries_count):
+            base_key = f"{EntitySensorKey.BATTERY}{index + 1}"
+            channels.append((f"{base_key}_input_energy", f"Battery {index + 1} Input Energy"))
+            channels.append((f"{base_key}_output_energy", f"Battery {index + 1} Output Energy"))
+
+        # totals survive restarts through the warm start cache
+        restored = self.cache.energy.get(self.sn, {}) if self.cache is not None else {}
+        self.energy = EnergyAccumulator(len(channels))
+        for index, (key, name) in enumerate(channels):
+            slot = self.data.allocate("sensors", key, name)
+            self.energy_keys.append(key)
+            self.energy_slots.append(slot)
+            self.energy.totals[index] = restored.get(key, 0.0)
+            self.data.set(slot, round(self.energy.totals[index], 3))
+        if self.cache is not None:
+            self.cache.track_energy(self.sn, self.energy_totals)
+
+    def _apply(self, source: dict, timestamp: float | None):
+        """Apply every quota section present in a flattened HTTP snapshot or nested MQTT params."""
+        dispatch = self._dispatch
+        for key in source:
+            handlers = dispatch.get(key)
+            if handlers is None:
+                continue
+            for extract, parse in handlers:
+                value = extract(source)
+                if value is not MISSING:
+                    parse(value, timestamp)
+
+    def _parse_breakers_control_info(self, params, timestamp: float | None = None):
+        data = self.data
+        for breaker, slots in zip(params, self.breaker_slots):
+            consume_type = PowerType(breaker["ctrlSta"])
+            data.set(slots.priority, breaker["priority"])
+            data.set(slots.mode, breaker["ctrlMode"])
+            data.set(slots.source_type, consume_type)
+            data.set(slots.source, power_output_type[consume_type])
+
+    def _parse_breakers_power_info(self, params, timestamp: float | None = None):
+        data = self.data
+        energy_power = self.energy.power
         total_grid_power = 0
         for index, breaker in enumerate(params):
             power_value = breaker["chWatt"]
             consume_type = PowerType(breaker["powType"])
 
             if index < breakers_count:
-                base_key = f"{EntitySensorKey.BREAKER}{index}"
-                self.data.mapped_data["sensors"][base_key] = DataValue(f"Breaker {index + 1}", power_value)
+                data.set(self.breaker_slots[index].power, power_value)
+                energy_power[index] = power_value
                 if consume_type.is_grid():
                     total_grid_power += power_value
-            else:
-                bat_index = index - breakers_count + 1
-                base_key = f"{EntitySensorKey.BATTERY}{bat_index}"
+            elif index - breakers_count < self.batteries_count:
+                battery_index = index - breakers_count
+                slots = self.battery_slots[battery_index]
                 input_power = power_value if consume_type == PowerType.OFF else 0
                 output_power = power_value if consume_type != PowerType.OFF else 0
-                battery_name = f"Battery {bat_index}"
 
                 total_grid_power += input_power
 
-                self.data.mapped_data["sensors"][f"{base_key}_input"] = DataValue(name=f"{battery_name} Input",
-                                                                                  value=input_power)
-
-                self.data.mapped_data["sensors"][f"{base_key}_output"] = DataValue(name=f"{battery_name} Output",
-                                                                                   value=output_power)
-        self.data.mapped_data["sensors"][EntitySensorKey.SHP_GRID] = DataValue(name="Grid Usage", value=total_grid_power)
-
-    def _parse_battery_info(self, data):
+                data.set(slots.input, input_power)
+                data.set(slots.output, output_power)
+                energy_power[breakers_count + 1 + 2 * battery_index] = input_power
+                energy_power[breakers_count + 2 + 2 * battery_index] = output_power
+        data.set(self.grid_slot, total_grid_power)
+        energy_power[breakers_count] = total_grid_power
+        self._integrate_energy(timestamp)
+        if timestamp is not None:
+            self.power_rolling.read(timestamp)
+
+    def _integrate_energy(self, timestamp: float | None):
+        energy = self.energy
+        if timestamp is None:
+            # http snapshots have no reading time
+            energy.restart()
+            return
+        if not energy.integrate(timestamp):
+            return
+        data = self.data
+        for slot, total in zip(self.energy_slots, energy.totals):
+            data.set(slot, round(total, 3))
+        if timestamp - self._energy_checkpoint >= ENERGY_CHECKPOINT_INTERVAL:
+            self._energy_checkpoint = timestamp
+            # messages are integrated on the mqtt thread, the cache lives on the loop
+            self.coordinator.hass.loop.call_soon_threadsafe(self._checkpoint_energy)
+
+    def energy_totals(self) -> dict[str, float]:
+        # integrated on the mqtt thread under the data lock
+        with self.data.lock:
+            return dict(zip(self.energy_keys, self.energy.totals))
+
+    def _checkpoint_energy(self):
+        if self.cache is not None and self.energy is not None:
+            self.cache.set_energy(self.sn, self.energy_totals())
+
+    def _parse_battery_info(self, params, timestamp: float | None = None):
+        data = self.data
         shp_max_output = 0
-        for index, battery_info in enumerate(data):
-            battery_name = f"Battery {index + 1}"
+        for battery_info, slots in zip(params, self.battery_slots):
             battery_states = battery_info["stateBean"]
-            is_connected = bool(battery_states["isConnect"])
             battery_rate_power = battery_info["ratePower"]
             shp_max_output += battery_rate_power
-            base_key = f"{EntitySensorKey.BATTERY}{index + 1}"
 
             # sensors
-            self.data.mapped_data["sensors"][f"{base_key}_connected"] = DataValue(name=f"{battery_name} Connected",
-                                                                                  value=is_connected)
-
-            self.data.mapped_data["sensors"][f"{base_key}_enabled"] = DataValue(name=f"{battery_name} Enabled",
-                                                                                value=bool(battery_states["isEnable"]))
-
-            self.data.mapped_data["sensors"][f"{base_key}_grid_charging"] = DataValue(name=f"{battery_name} Grid Charging",
-                                                                                      value=bool(battery_states["isGridCharge"]))
-
-            self.data.mapped_data["sensors"][f"{base_key}_mppt_charging"] = DataValue(name=f"{battery_name} MPPT Charging",
-                                                                                      value=bool(battery_states["isMpptCharge"]))
+            data.set(slots.connected, bool(battery_states["isConnect"]))
+            data.set(slots.enabled, bool(battery_states["isEnable"]))
+            data.set(slots.grid_charging, bool(battery_states["isGridCharge"]))
+            data.set(slots.mppt_charging, bool(battery_states["isMpptCharge"]))
+            data.set(slots.ac_open, bool(battery_states["isAcOpen"]))
+            data.set(slots.discharge_time, battery_info["dischargeTime"])
+            data.set(slots.charge_time, battery_info["chargeTime"])
+            data.set(slots.level, battery_info["batteryPercentage"])
+            data.set(slots.power_rate, battery_rate_power)
+            data.set(slots.bat_temp, battery_info["emsBatTemp"])
 
-            self.data.mapped_data["sensors"][f"{base_key}_ac_open"] = DataValue(name=f"{battery_name} AC Open",
-                                                                                value=bool(battery_states["isAcOpen"]))
-
-            self.data.mapped_data["sensors"][f"{base_key}_discharge_time"] = DataValue(name=f"{battery_name} Discharge Time",
-                                                                                       value=battery_info["dischargeTime"])
-
-            self.data.mapped_data["sensors"][f"{base_key}_charge_time"] = DataValue(name=f"{battery_name} Charge Time",
-                                                                                        value=battery_info["chargeTime"])
+            # switches
+            data.set(slots.charge_switch, bool(battery_states["isGridCharge"]))
 
-            self.data.mapped_data["sensors"][f"{base_key}"] = DataValue(name=battery_name,
-                                                                        value=battery_info["batteryPercentage"])
+        data.set(self.grid_max_output_slot, shp_max_output)
+        if timestamp is not None:
+            self.temp_rolling.read(timestamp)
 
-            self.data.mapped_data["sensors"][f"{base_key}_power_rate"] = DataValue(name=f"{battery_name} Power Rate",
-                                                                                   value=battery_rate_power)
+    def _parse_current_limits(self, params, timestamp: float | None = None):
+        for index, limit in enumerate(params):
+            if index < breakers_count:
+                self.data.set(self.breaker_slots[index].cur_limit, limit)
+            elif index - breakers_count < self.batteries_count:
+                self.data.set(self.battery_slots[index - breakers_count].cur_limit, limit)
 
-            self.data.mapped_data["sensors"][f"{base_key}_bat_temp"] = DataValue(name=f"{battery_name} Battery Temperature",
-                                                                                 value=battery_info["emsBatTemp"])
-
-            # switches
-            self.data.mapped_data["switches"][f"{base_key}_charge_switch"] = DataValue(name=f"{battery_name} Charging",
-                                                                                      value=bool(battery_states["isGridCharge"]))
+    def _parse_eps_info(self, status, timestamp: float | None = None):
+        self.data.set(self.eps_slot, status)
 
+    def _update_battery_visibility(self, batteries_info):
+        for index, battery_info in enumerate(batteries_info):
+            base_key = f"{EntitySensorKey.BATTERY}{index + 1}"
+            is_connected = bool(battery_info["stateBean"]["isConnect"])
             self.data.entity_visibility[base_key] = is_connected
             for suffix in battery_suffixes:
                 self.data.entity_visibility[f"{base_key}{suffix}"] = is_connected
 
-        self.data.mapped_data["sensors"][f"{EntitySensorKey.SHP_GRID}_max_output"] = DataValue(name="Grid Max Output Power",
-                                                                                               value=shp_max_output)
-
-    def _parse_eps_info(self, status):
-        self.data.mapped_data["switches"]["eps"] = DataValue(name="EPS Mode",
-                                                             value=status)
-
     def _build_structure(self):
         if self.data.response_data is not None:
             local_data = self.data.response_data
 
-            breakers_controls_info = local_data[http_breaker_ctrls_key]
             breaker_names_data = local_data["loadChInfo"]["info"]
-            breakers_power_values = local_data[http_breaker_value_key]
             breakers_enablement = local_data["chUseInfo.isEnable"]
             batteries_info = local_data[http_battery_info_key]
-            breaker_current_limit = local_data["loadChCurInfo.cur"]
 
-            self.data.mapped_data["sensors"] = {}
-            self.data.mapped_data["switches"] = {}
-            self.data.mapped_data["selects"] = {}
+            if not self.data.allocated:
+                self._allocate(len(batteries_info))
 
-            self._parse_breakers_control_info(breakers_controls_info)
-            self._parse_breakers_power_info(breakers_power_values)
-            self._parse_eps_info(local_data["epsModeInfo.eps"])
+            # snapshots have no reading time
+            self._apply(local_data, None)
 
             # one time data, not comes from mqtt (for now)
             for index, info in enumerate(breaker_names_data):
@@ -252,25 +402,14 @@ class SmartHomePanel(BaseDevice):
                 for suffix in breaker_suffixes:
                     self.data.entity_visibility[f"{base_key}{suffix}"] = visible
 
-            for index, limit in enumerate(breaker_current_limit):
-                if index < breakers_count:
-                    base_key = f"{EntitySensorKey.BREAKER}{index}"
-                    self.data.mapped_data["sensors"][f"{base_key}_cur_limit"] = DataValue(f"Breaker {index + 1} current limit",
-                                                                                          value=limit)
-                else:
-                    bat_index = index - breakers_count + 1
-                    base_key = f"{EntitySensorKey.BATTERY}{bat_index}"
-                    self.data.mapped_data["sensors"][f"{base_key}_cur_limit"] = DataValue(f"Battery {bat_index} current limit",
-                                                                                          value=limit)
-
-            self.data.mapped_data["sensors"][EntitySensorKey.BATTERIES_COUNT] = len(batteries_info)
-
-            self._parse_battery_info(batteries_info)
+            self._update_battery_visibility(batteries_info)
 
 
     def _sensors(self) -> list[BaseSensor]:
+        # entity classes load with their platform
+        from ..sensor import SENSOR_CLASSES, AmpSensorEntity, EnergySensorEntity, InfoSensor, WattsSensorEntity
+
         sensors = list()
-        all_data = self.data.mapped_data["sensors"]
         # setup breakers sensors
         for i in range(breakers_count):
             base_key = f"{EntitySensorKey.BREAKER}{i}"
@@ -280,28 +419,30 @@ class SmartHomePanel(BaseDevice):
                 InfoSensor(self, f"{base_key}_mode"),
                 InfoSensor(self, f"{base_key}_source"),
                 AmpSensorEntity(self, f"{base_key}_cur_limit"),
+                EnergySensorEntity(self, f"{base_key}_energy"),
             ])
         sensors.append(WattsSensorEntity(self, EntitySensorKey.SHP_GRID))
         sensors.append(WattsSensorEntity(self, f"{EntitySensorKey.SHP_GRID}_max_output"))
+        sensors.append(EnergySensorEntity(self, f"{EntitySensorKey.SHP_GRID}_energy"))
 
-        batteries_count = self.data.mapped_data["sensors"][EntitySensorKey.BATTERIES_COUNT]
-        for i in range(batteries_count):
+        for i in range(self.batteries_count):
             base_key = f"{EntitySensorKey.BATTERY}{i + 1}"
-            for suffix, cls in battery_suffixes_and_classes:
+            for suffix, kind in battery_suffixes_and_kinds:
                 sensor_key = f"{base_key}{suffix}"
                 _LOGGER.info(f"getting {sensor_key}")
-                if sensor_key in self.data.mapped_data["sensors"]:
-                    sensor = cls(self, sensor_key)
+                if self.data.has_value("sensors", sensor_key):
+                    sensor = SENSOR_CLASSES[kind](self, sensor_key)
                     sensors.append(sensor)
 
         return sensors
 
     def switches(self) -> list[SwitchEntity]:
+        from ..switch import EnableSwitch
+
         switches = [
             EnableSwitch(self, "eps", 11, 24, { "eps": 1 }, { "eps": 0 })
         ]
-        batteries_count = self.data.mapped_data["sensors"][EntitySensorKey.BATTERIES_COUNT]
-        for i in range(batteries_count):
+        for i in range(self.batteries_count):
             base_key = f"{EntitySensorKey.BATTERY}{i + 1}_charge_switch"
             ch = battery_start_index + i
             switches.append(
@@ -311,6 +452,8 @@ class SmartHomePanel(BaseDevice):
         return switches
 
     def selects(self) -> list[SelectEntity]:
+        from ..select import BreakerModeSelect
+
         selects = []
         for i in range(breakers_count):
             base_key = f"{EntitySensorKey.BREAKER}{i}"
@@ -0,0 +1,20 @@
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .coordinator import EcoflowCoordinatorDataUpdateCoordinator
+from .const import DOMAIN
+
+TO_REDACT = {"apikey", "secret", "certificateAccount", "certificatePassword"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "devices": {device.sn: device.diagnostics() for device in coordinator.data},
+        "mqtt": coordinator.api_client.mqtt_client.diagnostics(),
+        "http": coordinator.api_client.client.diagnostics(),
+    }
@@ -1,33 +1,73 @@
 from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import timedelta
 from collections.abc import Mapping
 import logging
+import time
 from typing import Any, Self
 
 from ..device.breaker import BreakerMode
-from ..device.command import BaseEntityCommand, CommandTarget
+from ..device.command import BaseEntityCommand
 
+from ..api.http_client import EcoflowException
+from ..api.metrics import Histogram
 from ..const import ECOFLOW_DOMAIN
-from ..device import BaseDevice, EntityUpdateCoordinator, DataValue
+from ..device import BaseDevice, EntityUpdateCoordinator
+from ..device.rolling import attribute_names
 
 from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor.const import SensorStateClass
+from homeassistant.const import EntityCategory
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.components.select import SelectEntity
+from homeassistant.core import CALLBACK_TYPE, callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 _LOGGER = logging.getLogger(__name__)
 
+@dataclass(frozen=True)
+class PublishPolicy:
+    """Limits how often a changing value is written to the state machine.
+
+    A change within the deadband (absolute, or percent of the written value) is
+    held back until `max_interval` has passed since the last write, and writes
+    are at least `min_interval` apart. Held back values are written by a timer,
+    so the latest value always ends up in the state machine.
+    """
+    deadband: float = 0
+    deadband_percent: float = 0
+    min_interval: float = 0
+    max_interval: float | None = None
+
+    def significant(self, value, written) -> bool:
+        if not isinstance(value, (int, float)) or not isinstance(written, (int, float)):
+            return value != written
+        threshold = max(self.deadband, abs(written) * self.deadband_percent / 100)
+        return abs(value - written) > threshold
+
 class BaseEntity(CoordinatorEntity[EntityUpdateCoordinator], Entity):
+    data_group = "sensors"
+    # None writes every change
+    publish_policy: PublishPolicy | None = None
+
     def __init__(self, device: BaseDevice, data_key) -> None:
         super().__init__(device.coordinator)
         self.device = device
         self.data_key = data_key
-
-        values = self.get_value_from_db()
-        self._attr_name = f"{device.sn} {values.name}"
-        self._sensor_id = values.name
-        self.set_entity_value(values.value)
+        # bound once, updates read the slot directly
+        self._slot = self.device.data.slot(self.data_group, data_key)
+
+        name = self.value_name()
+        self._attr_name = f"{device.sn} {name}"
+        self._sensor_id = name
+        self._written_value = self.current_value()
+        self._written_at = time.monotonic()
+        self._written_generation = self.current_generation()
+        self._cancel_flush: CALLBACK_TYPE | None = None
+        self.set_entity_value(self._written_value)
         self.entity_enabled = True
 
         if data_key in self.device.data.entity_visibility:
@@ -39,24 +79,88 @@ class BaseEntity(CoordinatorEntity[EntityUpdateCoordinator], Entity):
     def set_entity_value(self, value):
         pass
 
-    def get_value_from_db(self) -> DataValue:
-        return None
+    def value_name(self) -> str:
+        return self.device.data.names[self._slot]
+
+    def current_value(self) -> Any:
+        return self.device.data.snapshot.values[self._slot]
+
+    def current_generation(self) -> int:
+        return self.device.data.snapshot.generations[self._slot]
 
     def _handle_coordinator_update(self) -> None:
-        values = self.get_value_from_db()
-        self.set_entity_value(values.value)
+        data = self.device.data
+        generation = self.current_generation()
+        if generation == self._written_generation:
+            data.suppressed_writes += 1
+            return
+        value = self.current_value()
+        now = time.monotonic()
+        if self.publish_policy is not None and not self.__should_publish(value, now):
+            data.throttled_writes += 1
+            return
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+        self.set_entity_value(value)
+        self._written_value = value
+        self._written_at = now
+        self._written_generation = generation
+        data.state_writes += 1
+        self.device.metrics.count_write(type(self).__name__)
         self.async_write_ha_state()
 
+    def __should_publish(self, value, now: float) -> bool:
+        policy = self.publish_policy
+        since = now - self._written_at
+        if since < policy.min_interval:
+            self.__schedule_flush(policy.min_interval - since)
+            return False
+        if policy.max_interval is not None and since >= policy.max_interval:
+            return True
+        if policy.significant(value, self._written_value):
+            return True
+        if policy.max_interval is not None:
+            self.__schedule_flush(policy.max_interval - since)
+        return False
+
+    def __schedule_flush(self, delay: float):
+        if self._cancel_flush is None:
+            self._cancel_flush = async_call_later(self.coordinator.hass, delay, self.__flush)
+
+    @callback
+    def __flush(self, _now) -> None:
+        self._cancel_flush = None
+        self._handle_coordinator_update()
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+        await super().async_will_remove_from_hass()
+
 class BaseCommandEntity(BaseEntity):
     def __init__(self, device: BaseDevice, data_key) -> None:
         super().__init__(device, data_key)
         self._last_msg_id = None
 
+    def set_optimistic_value(self, value):
+        """Show the commanded value until the next snapshot, which writes the state the device reports."""
+        self.set_entity_value(value)
+        # the slot generation may not change when the device refuses, the next update must not be suppressed
+        self._written_generation = None
+        self.async_write_ha_state()
+
     async def send_command(self, command: BaseEntityCommand) -> bool:
         self._last_msg_id = command.id
-        return await self.device.api_client.send_command(self.device.sn, command, CommandTarget.MQTT)
+        try:
+            return await self.device.commands.async_submit(command)
+        except EcoflowException as error:
+            raise HomeAssistantError(f"Failed to send command to {self.device.sn}: {error}") from error
 
 class BaseSwitch(BaseCommandEntity, SwitchEntity):
+    data_group = "switches"
+
     async def switch(self, status: bool):
         pass
 
@@ -82,18 +186,17 @@ class BaseSwitch(BaseCommandEntity, SwitchEntity):
     def unique_id(self):
         return f"{self.device.sn}_{self._sensor_id}"
 
-    def get_value_from_db(self) -> DataValue:
-        return self.device.data.mapped_data["switches"][self.data_key]
-
     def set_entity_value(self, value):
         self._attr_is_on = value
-        values = self.device.data.mapped_data["switches"][self.data_key]
-        values.value = value
 
 class BaseSensor(BaseEntity, SensorEntity):
+    # rolling statistics change with every write, keep them out of the recorder
+    _unrecorded_attributes = attribute_names()
+
     def __init__(self, device: BaseDevice, data_key) -> None:
         super().__init__(device, data_key)
         self.__attrs = OrderedDict[str, Any]()
+        self.__rolling = device.rolling.get(self._slot)
 
         if data_key in self.device.data.mapped_custom_attrs:
             custom_attrs = self.device.data.mapped_custom_attrs[data_key]
@@ -101,7 +204,9 @@ class BaseSensor(BaseEntity, SensorEntity):
 
     @property
     def extra_state_attributes(self) -> Mapping[str, Any] | None:
-        return self.__attrs
+        if self.__rolling is None:
+            return self.__attrs
+        return {**self.__attrs, **self.__rolling.attributes()}
 
     @property
     def device_info(self) -> DeviceInfo | None:
@@ -120,9 +225,6 @@ class BaseSensor(BaseEntity, SensorEntity):
     def set_entity_value(self, value):
         self._attr_native_value = value
 
-    def get_value_from_db(self) -> DataValue:
-        return self.device.data.mapped_data["sensors"][self.data_key]
-
 class BreakerSelect(BaseCommandEntity, SelectEntity):
     def __init__(self, device: BaseDevice, data_key, index: int, mode_key: str, source_key: str) -> None:
         self.breaker_options = BreakerMode()
@@ -130,6 +232,8 @@ class BreakerSelect(BaseCommandEntity, SelectEntity):
         self.mode_key = mode_key
         self.source_key = source_key
         self.breaker_index = index
+        self._mode_slot = device.data.slot("sensors", mode_key)
+        self._source_slot = device.data.slot("sensors", source_key)
         super().__init__(device, data_key)
 
         if mode_key in self.device.data.entity_visibility:
@@ -155,8 +259,76 @@ class BreakerSelect(BaseCommandEntity, SelectEntity):
     def set_entity_value(self, value: str):
         self._attr_current_option = value
 
-    def get_value_from_db(self) -> DataValue:
-        ctrl = self.device.data.mapped_data["sensors"][self.mode_key].value
-        sta = self.device.data.mapped_data["sensors"][self.source_key].value
-        new_value = self.breaker_options.get_action_name(ctrl, sta)
-        return DataValue(f"Breaker {self.breaker_index + 1} mode select", new_value, True)
\ No newline at end of file
+    def value_name(self) -> str:
+        return f"Breaker {self.breaker_index + 1} mode select"
+
+    def current_value(self) -> str:
+        values = self.device.data.snapshot.values
+        return self.breaker_options.get_action_name(values[self._mode_slot], values[self._source_slot])
+
+    def current_generation(self) -> int:
+        generations = self.device.data.snapshot.generations
+        return max(generations[self._mode_slot], generations[self._source_slot])
+
+
+class BaseMetricSensor(SensorEntity):
+    """Diagnostic sensor with integration metrics, polled and disabled by default."""
+    _attr_should_poll = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, unique_prefix: str, name: str, device: BaseDevice | None = None,
+                 account: DeviceInfo | None = None) -> None:
+        self.device = device
+        # account level metrics belong to a device of the config entry instead of a panel
+        self.account = account
+        self._attr_unique_id = f"{unique_prefix}_{name}"
+        if account is None:
+            self._attr_name = f"{unique_prefix} {name}"
+        else:
+            self._attr_has_entity_name = True
+            self._attr_name = name
+        self.update_metric()
+
+    @property
+    def device_info(self) -> DeviceInfo | None:
+        if self.device is None:
+            return self.account
+        return DeviceInfo(
+            identifiers={(ECOFLOW_DOMAIN, f"{self.device.name}-{self.device.sn[-4:]}")},
+            manufacturer="EcoFlow",
+            name=self.device.name,
+            model=self.device.name,
+            serial_number=self.device.sn
+        )
+
+    async def async_update(self) -> None:
+        self.update_metric()
+
+    def update_metric(self):
+        pass
+
+class BaseHistogramSensor(BaseMetricSensor):
+    """Mean over the last poll interval, percentiles since start as attributes."""
+
+    def __init__(self, unique_prefix: str, name: str, histogram: Histogram, device: BaseDevice | None = None,
+                 account: DeviceInfo | None = None) -> None:
+        self.histogram = histogram
+        self._last_count = 0
+        self._last_total = 0.0
+        super().__init__(unique_prefix, name, device, account)
+
+    def update_metric(self):
+        histogram = self.histogram
+        count = histogram.count - self._last_count
+        if count:
+            self._attr_native_value = round((histogram.total - self._last_total) / count, 2)
+        self._last_count = histogram.count
+        self._last_total = histogram.total
+        self._attr_extra_state_attributes = {
+            "count": histogram.count,
+            "p50": histogram.percentile(0.5),
+            "p99": histogram.percentile(0.99),
+            "max": round(histogram.max, 2),
+        }
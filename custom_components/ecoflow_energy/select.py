@@ -1,24 +1,34 @@
 import logging
 
 from .coordinator import EcoflowCoordinatorDataUpdateCoordinator
-from .device import BaseDevice, DataValue
+from .device import BaseDevice
 from .device.command import BaseEntityCommand, CommandId, CommandSet
 from homeassistant.const import EntityCategory
 from .entity import BreakerSelect
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_DEVICE_READY
 from .device.breaker import BreakerMode
 
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN]["coordinator"]
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
     _LOGGER.info("Init selects")
     entities = []
 
-    for device in coordinator.data:
+    @callback
+    def add_device(device: BaseDevice):
+        async_add_entities(device.selects())
+
+    for device in coordinator.ready_devices:
         entities.extend(device.selects())
     async_add_entities(entities)
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICE_READY.format(config_entry.entry_id), add_device)
+    )
 
 class BreakerModeSelect(BreakerSelect):
     _attr_entity_category = EntityCategory.CONFIG
@@ -31,5 +41,4 @@ class BreakerModeSelect(BreakerSelect):
         command = BaseEntityCommand(self.device.sn, self.cmdSet, self.cmdId, params)
         res = await self.send_command(command)
         if res:
-            self.set_entity_value(option)
-            self.async_write_ha_state()
\ No newline at end of file
+            self.set_optimistic_value(option)
\ No newline at end of file
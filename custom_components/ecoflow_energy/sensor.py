@@ -1,28 +1,82 @@
 import logging
+import time
 from typing import Any
 from homeassistant.components.sensor.const import SensorDeviceClass, SensorStateClass
 from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfElectricCurrent, UnitOfEnergy, UnitOfPower, UnitOfTemperature, UnitOfTime
-from .entity import BaseSensor, BaseSwitch
+from .device import BaseDevice
+from .device.registry import EntityKind
+from .entity import BaseHistogramSensor, BaseMetricSensor, BaseSensor, BaseSwitch, PublishPolicy
 
 from .coordinator import EcoflowCoordinatorDataUpdateCoordinator
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_DEVICE_READY
+
+from homeassistant.core import callback
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import DeviceInfo
 
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN]["coordinator"]
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
     _LOGGER.info("Init sensors")
     entities = []
 
-    for device in coordinator.data:
+    @callback
+    def add_device(device: BaseDevice):
+        async_add_entities(device._sensors() + device_metric_sensors(device))
+
+    for device in coordinator.ready_devices:
         entities.extend(device._sensors())
+        entities.extend(device_metric_sensors(device))
+    entities.extend(account_metric_sensors(config_entry, coordinator.api_client))
     async_add_entities(entities)
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICE_READY.format(config_entry.entry_id), add_device)
+    )
+
+def device_metric_sensors(device: BaseDevice) -> list[BaseMetricSensor]:
+    metrics = device.metrics
+    return [
+        MessagesMetricSensor(device),
+        TimeMetricSensor(device.sn, "MQTT apply time", metrics.apply_us, UnitOfTime.MICROSECONDS, device),
+        TimeMetricSensor(device.sn, "Entity fan-out time", metrics.fanout_us, UnitOfTime.MICROSECONDS, device),
+        StateWritesMetricSensor(device),
+        ApplyFailuresMetricSensor(device),
+    ]
+
+def account_device_info(config_entry) -> DeviceInfo:
+    """Device of a config entry, holds the metrics of the account's connections."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, config_entry.entry_id)},
+        manufacturer="EcoFlow",
+        name=config_entry.title,
+        entry_type=DeviceEntryType.SERVICE,
+    )
+
+def account_metric_sensors(config_entry, api_client) -> list[BaseMetricSensor]:
+    entry_id = config_entry.entry_id
+    account = account_device_info(config_entry)
+    http = api_client.client
+    connection = api_client.mqtt_client.connection
+    return [
+        TimeMetricSensor(entry_id, "HTTP latency", http.latency_ms, UnitOfTime.MILLISECONDS, account=account),
+        HttpErrorsMetricSensor(entry_id, http, account),
+        TimeMetricSensor(entry_id, "Command round trip", api_client.mqtt_client.correlator.round_trip_ms,
+                         UnitOfTime.MILLISECONDS, account=account),
+        TimeMetricSensor(entry_id, "MQTT parse time", api_client.mqtt_client.parse_stats.parse_us,
+                         UnitOfTime.MICROSECONDS, account=account),
+        ReconnectsMetricSensor(entry_id, connection, account),
+        TimeMetricSensor(entry_id, "MQTT time to recover", connection.recovery_s, UnitOfTime.SECONDS,
+                         account=account),
+    ]
 
 class RemainSensorEntity(BaseSensor):
     _attr_device_class = SensorDeviceClass.DURATION
     _attr_native_unit_of_measurement = UnitOfTime.MINUTES
     _attr_state_class = SensorStateClass.MEASUREMENT
     _attr_native_value = 0
+    publish_policy = PublishPolicy(deadband=5, min_interval=30, max_interval=600)
 
     def set_entity_value(self, value):
         self._attr_native_value = round(value)
@@ -32,6 +86,8 @@ class WattsSensorEntity(BaseSensor):
     _attr_native_unit_of_measurement = UnitOfPower.WATT
     _attr_state_class = SensorStateClass.MEASUREMENT
     _attr_native_value = 0
+    # power changes a little on every heartbeat, only changes of 5 W / 2 % are written right away
+    publish_policy = PublishPolicy(deadband=5, deadband_percent=2, min_interval=5, max_interval=300)
 
     def set_entity_value(self, value):
         self._attr_native_value = round(value)
@@ -40,6 +96,15 @@ class WattsSensorEntity(BaseSensor):
         super().value(round(value, 2))
 
 
+class EnergySensorEntity(BaseSensor):
+    """Energy integrated from channel power in the message path."""
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_value = 0
+    publish_policy = PublishPolicy(deadband=0.01, min_interval=30, max_interval=300)
+
+
 class LevelSensorEntity(BaseSensor):
     _attr_device_class = SensorDeviceClass.BATTERY
     _attr_native_unit_of_measurement = PERCENTAGE
@@ -61,4 +126,101 @@ class TempSensorEntity(BaseSensor):
     _attr_device_class = SensorDeviceClass.TEMPERATURE
     _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
     _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_native_value = 0
\ No newline at end of file
+    _attr_native_value = 0
+    publish_policy = PublishPolicy(deadband=0.5, min_interval=30, max_interval=600)
+
+class TimeMetricSensor(BaseHistogramSensor):
+    _attr_device_class = SensorDeviceClass.DURATION
+
+    def __init__(self, unique_prefix, name, histogram, unit, device=None, account=None) -> None:
+        self._attr_native_unit_of_measurement = unit
+        super().__init__(unique_prefix, name, histogram, device, account)
+
+class MessagesMetricSensor(BaseMetricSensor):
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, device: BaseDevice) -> None:
+        super().__init__(device.sn, "MQTT messages", device)
+
+    def update_metric(self):
+        self._attr_native_value = self.device.metrics.messages
+
+class ApplyFailuresMetricSensor(BaseMetricSensor):
+    """MQTT messages that raised while applied, snapshot coalescing in attributes."""
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, device: BaseDevice) -> None:
+        super().__init__(device.sn, "MQTT apply failures", device)
+
+    def update_metric(self):
+        inbox = self.device.inbox
+        if inbox is None:
+            return
+        self._attr_native_value = inbox.failures
+        self._attr_extra_state_attributes = {
+            "received messages": inbox.received,
+            "coalesced snapshots": inbox.coalesced,
+            "published snapshots": inbox.published,
+        }
+
+class ReconnectsMetricSensor(BaseMetricSensor):
+    """MQTT reconnects, failures and credential refreshes in attributes."""
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, unique_prefix, connection, account=None) -> None:
+        self.connection = connection
+        super().__init__(unique_prefix, "MQTT reconnects", account=account)
+
+    def update_metric(self):
+        connection = self.connection
+        self._attr_native_value = connection.reconnects
+        self._attr_extra_state_attributes = {
+            "connected": connection.connected,
+            "failures": connection.failures,
+            "auth_failures": connection.auth_failures,
+            "credential_refreshes": connection.credential_refreshes,
+            "resumed_sessions": connection.resumed_sessions,
+        }
+
+class HttpErrorsMetricSensor(BaseMetricSensor):
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, unique_prefix, http_client, account=None) -> None:
+        self.http_client = http_client
+        super().__init__(unique_prefix, "HTTP errors", account=account)
+
+    def update_metric(self):
+        self._attr_native_value = self.http_client.errors
+
+class StateWritesMetricSensor(BaseMetricSensor):
+    """State writes per second since the previous poll, per entity class in attributes."""
+    _attr_native_unit_of_measurement = "writes/s"
+
+    def __init__(self, device: BaseDevice) -> None:
+        self._last_writes = {}
+        self._last_time = time.monotonic()
+        super().__init__(device.sn, "State writes", device)
+
+    def update_metric(self):
+        now = time.monotonic()
+        elapsed = max(now - self._last_time, 1)
+        writes = dict(self.device.metrics.state_writes)
+        rates = {
+            entity_class: round((count - self._last_writes.get(entity_class, 0)) / elapsed, 2)
+            for entity_class, count in writes.items()
+        }
+        self._attr_native_value = round(sum(rates.values()), 2)
+        self._attr_extra_state_attributes = rates
+        self._last_writes = writes
+        self._last_time = now
+
+# sensor class of each declared field kind
+SENSOR_CLASSES = {
+    EntityKind.POWER: WattsSensorEntity,
+    EntityKind.ENERGY: EnergySensorEntity,
+    EntityKind.BATTERY: LevelSensorEntity,
+    EntityKind.TEMPERATURE: TempSensorEntity,
+    EntityKind.DURATION: RemainSensorEntity,
+    EntityKind.CURRENT: AmpSensorEntity,
+    EntityKind.INFO: InfoSensor,
+}
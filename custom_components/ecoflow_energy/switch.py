@@ -4,20 +4,30 @@ from .coordinator import EcoflowCoordinatorDataUpdateCoordinator
 from .device import BaseDevice
 from homeassistant.const import EntityCategory
 from .entity import BaseSwitch
-from .device.command import BaseEntityCommand, CommandId, CommandSet
-from .const import DOMAIN
+from .device.command import BaseEntityCommand
+from .const import DOMAIN, SIGNAL_DEVICE_READY
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN]["coordinator"]
+    coordinator: EcoflowCoordinatorDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
     _LOGGER.info("Init switches")
     entities = []
 
-    for device in coordinator.data:
+    @callback
+    def add_device(device: BaseDevice):
+        async_add_entities(device.switches())
+
+    for device in coordinator.ready_devices:
         entities.extend(device.switches())
     async_add_entities(entities)
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICE_READY.format(config_entry.entry_id), add_device)
+    )
 
 class EnableSwitch(BaseSwitch):
     _attr_entity_category = EntityCategory.CONFIG
@@ -31,12 +41,10 @@ class EnableSwitch(BaseSwitch):
         self.args_off = args_off
 
     async def switch(self, status: bool):
-        cmdSet = CommandSet(self.cmd_set)
-        cmdId = CommandId(self.cmd_id)
         data = self.args_on if status == True else self.args_off
 
-        command = BaseEntityCommand(self.device.sn, cmdSet, cmdId, data)
+        # plain ints, command sets of other products aren't in CommandSet
+        command = BaseEntityCommand(self.device.sn, self.cmd_set, self.cmd_id, data)
         res = await self.send_command(command)
         if res:
-            self.set_entity_value(status)
-            self.async_write_ha_state()
+            self.set_optimistic_value(status)